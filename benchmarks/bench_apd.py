@@ -0,0 +1,26 @@
+"""
+    avalanche photodiode SNR and noise
+"""
+
+import numpy
+from scipy import constants
+from tiasim.avalanche_photodiode import AvalanchePhotodiode
+
+def _apd():
+    return AvalanchePhotodiode(k=0.01, effective_area=1, capacitance=1e-12, leakage=0, dark_current=10e-9,
+                               t_dark_current=constants.convert_temperature(23, "celsius", "kelvin"),
+                               dark_measurement_bw=1e6, gain=100)
+
+def bench_apd_snr():
+    apd = _apd()
+    return lambda: apd.calculate_snr(il=1e-6, bandwidth=1e6, R=10e3)
+
+def bench_apd_shot_noise():
+    apd = _apd()
+    return lambda: apd.calc_shot_noise_current(1e-6, 1e6)
+
+def bench_apd_optimal_gain_envelope():
+    apd = _apd()
+    il = numpy.logspace(-12, -5, 100)
+    t = numpy.linspace(230.0, 350.0, 100)
+    return lambda: apd.optimal_gain(il[:, None], bandwidth=1e6, t=t[None, :], R=10e3)
@@ -0,0 +1,18 @@
+"""
+    design-space sweep over the whole opamp and photodiode catalog
+"""
+
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.sweep import sweep, catalog
+
+def bench_catalog_sweep():
+    # 6 opamps x 5 photodiodes x 20 R_F, optimum C_F, 500 frequency points
+    parts = (catalog(opamps, tiasim.Opamp), catalog(photodiodes, tiasim.Photodiode))
+    R_F = numpy.logspace(2, 6, 20)
+    return lambda: sweep(*parts, R_F, workers=1)
+
+def bench_ensemble_stability():
+    ensemble = tiasim.TIAEnsemble(opamps.OPA818(), photodiodes.FDS015(), numpy.logspace(2, 6, 10000))
+    return ensemble.stability
@@ -0,0 +1,84 @@
+"""
+    TIA model hot paths: transimpedance, noise, bandwidth, C_F optimum and rise time.
+
+    bench_* functions set up a case and return the callable that is timed.
+    Those taking n are run for every n in sizes, the number of frequency
+    (or time) points.
+"""
+
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.risetime import analyze_edges
+
+sizes = (1000, 100000, 1000000)
+
+def _tia():
+    return tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+
+def _uncached(tia, method, *args):
+    """ call method with the response cache emptied first, so every call computes """
+    def run():
+        tia.response_cache.clear()
+        return method(*args)
+    return run
+
+def bench_ZM(n):
+    tia = _tia()
+    return _uncached(tia, tia.ZM, numpy.logspace(1, 10, n))
+
+def bench_amp_current_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.amp_current_noise, numpy.logspace(1, 10, n))
+
+def bench_amp_voltage_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.amp_voltage_noise, numpy.logspace(1, 10, n))
+
+def bench_johnson_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.johnson_noise, numpy.logspace(1, 10, n))
+
+def bench_shot_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.shot_noise, 1e-6, numpy.logspace(1, 10, n))
+
+def bench_dark_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.dark_noise, numpy.logspace(1, 10, n))
+
+def bench_bright_noise(n):
+    tia = _tia()
+    return _uncached(tia, tia.bright_noise, 1e-6, numpy.logspace(1, 10, n))
+
+def bench_noise_breakdown(n):
+    tia = _tia()
+    return _uncached(tia, tia.noise_breakdown, numpy.logspace(1, 10, n), 1e-6)
+
+def bench_bandwidth():
+    tia = _tia()
+    return _uncached(tia, tia.bandwidth)
+
+def bench_set_CF():
+    tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3)
+    return lambda: tia.replace(C_F=None)
+
+def bench_rise_time(n):
+    tia = _tia()
+    t = numpy.linspace(0.0, 20.0/tia.bandwidth(), n)
+    return _uncached(tia, tia.rise_time, t)
+
+def bench_analyze_edges(n):
+    # square wave with 10 periods, edges of 20 samples
+    x = numpy.arange(n)*1e-9
+    y = numpy.clip(numpy.sin(2*numpy.pi*10*numpy.arange(n)/n)*n/20/numpy.pi/10, -1, 1)
+    return lambda: analyze_edges(x, y)
+
+def bench_edge_batch():
+    # 200 noisy 10k-sample edges, half of them falling, as from a batch of scope captures
+    rng = numpy.random.default_rng(0)
+    x = numpy.arange(10000)*1e-9
+    center = rng.uniform(3000, 7000, (200, 1))
+    edges = 1.0/(1.0 + numpy.exp(-(numpy.arange(10000) - center)/rng.uniform(20, 200, (200, 1))))
+    y = numpy.where(rng.random((200, 1)) < 0.5, edges, -edges) + rng.normal(0, 0.01, edges.shape)
+    return lambda: analyze_edges(x, y)
@@ -0,0 +1,152 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Benchmark runner. Every bench_*() function of the bench_*.py modules in
+    this directory sets up a case and returns the callable to time; functions
+    taking an argument n run once per entry of the module's sizes tuple.
+
+    python benchmarks/run.py                        run all, print a table
+    python benchmarks/run.py -k noise --sizes 1000  only names containing 'noise', n=1000
+    python benchmarks/run.py -o results.json        save the results
+    python benchmarks/run.py --compare baseline.json    flag regressions, exit status 1 if any
+
+    Wall time is the best of --repeat timeit runs, each long enough (>= 0.2 s)
+    to average out timer resolution. Peak memory is the peak of memory traced by
+    tracemalloc (which includes numpy arrays) during one extra call.
+    Baselines are machine specific: regenerate benchmarks/baseline.json with -o
+    on the machine they are compared on.
+"""
+
+import argparse
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import numpy
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))    # benchmark the working tree, not an installed tiasim
+
+def load_benchmarks(directory=here):
+    """ dict of benchmark name to (module sizes, function), in file and definition order """
+    benchmarks = {}
+    for path in sorted(glob.glob(os.path.join(directory, "bench_*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        functions = [f for n, f in inspect.getmembers(module, inspect.isfunction)
+                     if n.startswith("bench_") and f.__module__ == module.__name__]
+        for function in sorted(functions, key=lambda f: f.__code__.co_firstlineno):
+            benchmarks["%s.%s" % (name[len("bench_"):], function.__name__[len("bench_"):])] = (
+                getattr(module, "sizes", ()), function)
+    return benchmarks
+
+def cases(benchmarks, pattern=None, sizes=None):
+    """ (case name, setup function) for every benchmark and size, e.g. "tia.ZM[1000]" """
+    for name, (module_sizes, function) in benchmarks.items():
+        if inspect.signature(function).parameters:
+            for n in (sizes or module_sizes):
+                case = "%s[%d]" % (name, n)
+                if not pattern or pattern in case:
+                    yield case, (lambda f=function, n=n: f(n))
+        elif not pattern or pattern in name:
+            yield name, function
+
+def measure(setup, repeat=3, min_time=0.2):
+    """ best wall time per call in s and peak traced memory in bytes of the callable setup() returns """
+    run = setup()
+    timer = timeit.Timer(run)
+    number = max(1, int(numpy.ceil(min_time/timer.timeit(1))))
+    best = min(timer.repeat(repeat=repeat, number=number))/number
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    return {"time": best, "peak_memory": peak, "number": number}
+
+def compare(results, baseline, time_tolerance=0.25, memory_tolerance=0.25, min_time=1e-5):
+    """
+        regressions of results against a baseline, as (case, kind, value, baseline value) tuples.
+        Times under min_time in both are not compared.
+    """
+    regressions = []
+    for case, r in results.items():
+        b = baseline.get(case)
+        if b is None:
+            continue
+        if max(r["time"], b["time"]) >= min_time and r["time"] > (1.0 + time_tolerance)*b["time"]:
+            regressions.append((case, "time", r["time"], b["time"]))
+        if r["peak_memory"] > (1.0 + memory_tolerance)*b["peak_memory"] + 4096:
+            regressions.append((case, "peak_memory", r["peak_memory"], b["peak_memory"]))
+    return regressions
+
+def _format_time(t):
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if t >= scale:
+            return "%7.3f %s" % (t/scale, unit)
+    return "%7.3f ns" % (t/1e-9)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the TIASim benchmarks")
+    parser.add_argument("-k", dest="pattern", help="only cases whose name contains this")
+    parser.add_argument("--sizes", type=int, nargs="+", help="override the modules' sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slow-down")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print("%-36s %12s %12s %10s" % ("case", "time", "peak MB", "vs base"))
+    for case, setup in cases(load_benchmarks(), args.pattern, args.sizes):
+        r = measure(setup, args.repeat)
+        results[case] = r
+        ratio = "%9.2fx" % (r["time"]/baseline[case]["time"]) if case in baseline else ""
+        print("%-36s %12s %12.2f %10s" % (case, _format_time(r["time"]), r["peak_memory"]/2**20, ratio))
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"machine": {"python": platform.python_version(), "numpy": numpy.__version__,
+                                   "processor": platform.processor() or platform.machine(),
+                                   "cpus": os.cpu_count()},
+                       "results": results}, f, indent=4, sort_keys=True)
+            f.write("\n")
+
+    regressions = compare(results, baseline, args.tolerance, args.tolerance)
+    for case, kind, value, base in regressions:
+        print("REGRESSION %s %s: %.4g vs baseline %.4g" % (case, kind, value, base))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -37,10 +37,10 @@ if __name__ == "__main__":
     C_parasitic = 0.1e-12
 
     diode = tiasim.photodiodes.S5973()
-    diode.capacitance = 1.6e-12
+    diode = diode.replace(capacitance=1.6e-12)
 
     opamp = tiasim.opamps.OPA657()
-    #opamp.AOL_gain = pow(10,65.0/20.0) # NOTE: modify to make it fit data!?
+    #opamp = opamp.replace(AOL_gain=pow(10,65.0/20.0)) # NOTE: modify to make it fit data!?
     # this could be because of capacitive load on the output??
     # MMCX connector on PCB, followed by ca 150mm thin coax, to SMA-connector.
 
@@ -51,14 +51,14 @@ if __name__ == "__main__":
     zm = numpy.abs( tia.ZM(f) ) # transimpedance
 
     # load experimental data
-    d = numpy.genfromtxt('OPA657_S5793_10kOhm.csv',comments='#',delimiter=',')
+    d = tiasim.read_spectrum('OPA657_S5793_10kOhm.csv')
 
 
-    df = d.T[0]
-    d_bright = d.T[2]
-    d_bright2 = d.T[1]
-    d_dark = d.T[3]
-    d_sa = d.T[4]
+    df = d.frequency
+    d_bright = d.traces[1]
+    d_bright2 = d.traces[0]
+    d_dark = d.traces[2]
+    d_sa = d.traces[3]
     #"""
 
     print("P optical ", P*1e6 , " uW")
@@ -88,12 +88,13 @@ if __name__ == "__main__":
     # output voltage noise
     plt.figure()
     print("amp_i")
-    amp_i = tia.amp_current_noise(f)
-    amp_v = tia.amp_voltage_noise(f)
-    john = tia.johnson_noise(f)
-    dark = tia.dark_noise(f)
-    shot = tia.shot_noise(P,f)
-    bright = tia.bright_noise(P, f)
+    noise = tia.noise_breakdown(f, P=P)
+    amp_i = noise.amp_current
+    amp_v = noise.amp_voltage
+    john = noise.johnson
+    dark = noise.dark
+    shot = noise.shot
+    bright = noise.bright
 
     plt.loglog(f,amp_i,label='amp i-noise')
     plt.loglog(f,amp_v,label='amp v-noise')
@@ -119,7 +120,7 @@ if __name__ == "__main__":
     plt.plot(df, d_dark,'o',label='Measured dark')
     plt.plot(df, d_sa,'o',label='Measured SA floor')
 
-    rbw = 10e3
+    rbw = d.metadata.rbw # spectrum analyzer RBW
     plt.semilogx(f, tiasim.v_to_dbm( tia.bright_noise(0, f), RBW = rbw),'-',label='TIASim Dark')
 
     for p in 1e-6*numpy.logspace(1, 8.5, 4):
@@ -26,17 +26,17 @@ gbwp = opa.GBWP
 
 
 # read gain
-d = numpy.genfromtxt('opa657_aol.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa657_aol.txt')
 f = [x[0] for x in d]
 aol = [pow(10,x[1]/20.0) for x in d]
 
 # read phase
-d = numpy.genfromtxt('opa657_phase.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa657_phase.txt')
 fp = [x[0] for x in d]
 phase = [x[1] for x in d]
 
 # read vnoise
-d = numpy.genfromtxt('opa657_v_noise.txt', comments='#', delimiter=' ')
+d = tiasim.load_table('opa657_v_noise.txt')
 fn = [x[0] for x in d]
 vn = [x[1] for x in d]
 print(fn, vn)
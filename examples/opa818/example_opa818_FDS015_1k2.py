@@ -48,14 +48,14 @@ if __name__ == "__main__":
     zm = numpy.abs( tia.ZM(f) ) # transimpedance
 
     # load experimental data
-    d = numpy.genfromtxt('OPA818_FDS015_1k2_0p7.csv',comments='#',delimiter=',')
-
-    rbw = 1e6 # spectrum analyzer RBW
-    df = d.T[0]
-    d_bright = d.T[4]
-    d_tg = d.T[3]
-    d_dark = d.T[2]
-    d_sa = d.T[1]
+    d = tiasim.read_spectrum('OPA818_FDS015_1k2_0p7.csv')
+
+    rbw = d.metadata.rbw # spectrum analyzer RBW
+    df = d.frequency
+    d_bright = d.traces[3]
+    d_tg = d.traces[2]
+    d_dark = d.traces[1]
+    d_sa = d.traces[0]
     d_tgcorr = d_tg - d_dark # TG feedthru
     d_bright_corr = d_bright - d_tgcorr
     #"""
@@ -87,12 +87,13 @@ if __name__ == "__main__":
     # output voltage noise
     plt.figure()
     #print "amp_i"
-    amp_i = tia.amp_current_noise(f)
-    amp_v = tia.amp_voltage_noise(f)
-    john = tia.johnson_noise(f)
-    dark = tia.dark_noise(f)
-    shot = tia.shot_noise(P,f)
-    bright = tia.bright_noise(P, f)
+    noise = tia.noise_breakdown(f, P=P)
+    amp_i = noise.amp_current
+    amp_v = noise.amp_voltage
+    john = noise.johnson
+    dark = noise.dark
+    shot = noise.shot
+    bright = noise.bright
 
     plt.loglog(f,amp_i,label='amp i-noise')
     plt.loglog(f,amp_v,label='amp v-noise')
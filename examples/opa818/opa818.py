@@ -26,25 +26,25 @@ gbwp = opa.GBWP
 
 
 # read gain
-d = numpy.genfromtxt('opa818_AOL_gain.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa818_AOL_gain.txt')
 f = [x[0]*1e6 for x in d]
 aol = [pow(10,x[1]/20.0) for x in d]
 print("Gain: ", f, aol)
 
 # read phase
-d = numpy.genfromtxt('opa818_AOL_phase.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa818_AOL_phase.txt')
 fp = [x[0]*1e6 for x in d]
 phase = [x[1] for x in d]
 print("Phase: ", fp, phase)
 
 # read vnoise
-d = numpy.genfromtxt('opa818_vn.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa818_vn.txt')
 fn = [x[0]*1e6 for x in d]
 vn = [x[1]*1e-9 for x in d] # from nV/sqrt(Hz)
 print("Vnoise: ", fn, vn)
 
 # read inoise
-d = numpy.genfromtxt('opa818_in.txt', comments='#', delimiter=',')
+d = tiasim.load_table('opa818_in.txt')
 fin = [x[0]*1e6 for x in d]
 inoise = [x[1]*1e-15 for x in d] # from fA/sqrt(Hz)
 print("Inoise: ", fin, inoise)
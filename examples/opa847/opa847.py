@@ -26,23 +26,23 @@ gbwp = opa.GBWP
 
 
 # read gain
-d = numpy.genfromtxt('opa847_gain.txt', comments='#',delimiter=',')
+d = tiasim.load_table('opa847_gain.txt')
 f = [x[0] for x in d]
 aol = [pow(10,x[1]/20.0) for x in d]
 
 # read phase
-d = numpy.genfromtxt('opa847_phase.txt', comments='#', delimiter='\t')
+d = tiasim.load_table('opa847_phase.txt')
 fp = [x[0] for x in d]
 phase = [x[1] for x in d]
 
 # read vnoise
-d = numpy.genfromtxt('opa847_v_noise.txt', comments='#', delimiter='\t')
+d = tiasim.load_table('opa847_v_noise.txt')
 fn = [x[0] for x in d]
 vn = [x[1]*1e-9 for x in d]
 print(fn, vn)
 
 # read inoise
-d = numpy.genfromtxt('opa847_i_noise.txt', comments='#', delimiter='\t')
+d = tiasim.load_table('opa847_i_noise.txt')
 fi = [x[0] for x in d]
 vi = [x[1]*1e-12 for x in d]
 print(fi, vi)
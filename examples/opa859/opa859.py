@@ -51,7 +51,7 @@ T=273+25;       # Temperature
 
 # open loop gain of amp
 #tmp=load('opa657_absA.dat');
-tmp=numpy.genfromtxt('opa859_gain.txt',delimiter=",")
+tmp=tiasim.load_table('opa859_gain.txt')
 #print(tmp)
 f=numpy.array(tmp[:,0])*1e3 # to Hz
 A=numpy.array(tmp[:,1])
@@ -103,7 +103,7 @@ plt.legend()
 
 
 # voltage noise of amp
-tmp=numpy.genfromtxt('opa859_vn.txt', delimiter=',');
+tmp=tiasim.load_table('opa859_vn.txt');
 e_F=tmp[:,0] # Hz
 e_N=tmp[:,1]*1e-9  # V / sqrt(Hz), input file in nV/sqrt(Hz)
 #e2_N=e_N**2;  # V^2 / Hz
@@ -133,7 +133,7 @@ plt.ylabel('V/sqrt(Hz)')
 #plt.show()
 
 # current noise of amp
-tmp=numpy.genfromtxt('opa859_in.txt', delimiter=',');
+tmp=tiasim.load_table('opa859_in.txt');
 i_F=tmp[:,0] # Hz
 i_N=tmp[:,1]*1e-15  # A / sqrt(Hz)
 #e2_N=e_N**2;  # V^2 / Hz
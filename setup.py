@@ -14,6 +14,7 @@ setup(name='tiasim',
     author_email='simon.hobbs@electrooptical.net',
     license='GPL-3.0',
     packages=find_packages(),
+    package_data={'tiasim.opamps': ['parameters.json']},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
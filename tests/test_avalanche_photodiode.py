@@ -1,5 +1,9 @@
 import unittest
-from tiasim.avalanche_photodiode import AvalanchePhotodiode, estimate_thermal_carrier_currents
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.tools import fermi_dirac_dist
+from tiasim.avalanche_photodiode import AvalanchePhotodiode, estimate_thermal_carrier_currents, optimal_apd_gain
 from scipy import constants
 
 class DemoApd(AvalanchePhotodiode):
@@ -40,5 +44,89 @@ class TestApd(unittest.TestCase):
     def test_snr(self):
         self.assertEqual(self.apd.calculate_snr(il=0, bandwidth=1), 0)
 
+    def test_snr_map(self):
+        M = numpy.array([10.0, 100.0, 300.0])
+        il = numpy.logspace(-12, -6, 4)
+        snr = self.apd.calculate_snr(il[None, :], bandwidth=1e6, R=10e3, M=M[:, None])
+        self.assertEqual(snr.shape, (3, 4))
+        for i, m in enumerate(M):
+            for j, current in enumerate(il):
+                apd = self.apd.replace(gain=m)
+                self.assertAlmostEqual(snr[i, j]/apd.calculate_snr(il=current, bandwidth=1e6, R=10e3), 1.0, places=12)
+
+    def test_temperature_arrays(self):
+        t = numpy.array([250.0, 300.0, 350.0])
+        noise = self.apd.calc_shot_noise_current(1e-9, 1e6, t=t)
+        self.assertEqual(noise.shape, (3,))
+        self.assertTrue(numpy.all(numpy.diff(noise) > 0))
+        with self.assertRaises(ValueError):
+            fermi_dirac_dist(numpy.array([300.0, 0.0]))
+        with self.assertRaises(ValueError):
+            estimate_thermal_carrier_currents(300.0, 1, 1, 0.0, 300.0)
+
+    def test_optimal_gain(self):
+        il = numpy.logspace(-9, -5, 5)
+        t = numpy.array([250.0, 300.0, 350.0])
+        best = self.apd.optimal_gain(il[:, None], bandwidth=1e6, t=t[None, :], R=10e3)
+        self.assertEqual(best.M.shape, (5, 3))
+        M = numpy.logspace(0, 4, 4001)
+        for i, current in enumerate(il):
+            for j, temperature in enumerate(t):
+                snr = self.apd.calculate_snr(current, 1e6, temperature, 10e3, M)
+                self.assertAlmostEqual(best.snr[i, j]/snr.max(), 1.0, places=5)
+                self.assertGreaterEqual(best.snr[i, j], snr.max()*(1 - 1e-12))
+        self.assertTrue(numpy.all(numpy.diff(best.M, axis=0) <= 0))  # more signal, less gain
+        self.assertEqual(self.apd.optimal_gain(0.0, 1e6, R=10e3).M, 1.0)
+
+    def test_optimal_gain_fallback(self):
+        # k = 1 has no closed form here, the golden-section search takes over
+        closed = optimal_apd_gain(1e-9, 300.0, 0.999999, 1e6, 10e3, 1e-12, M_max=1e6)
+        searched = optimal_apd_gain(1e-9, 300.0, 1.0, 1e6, 10e3, 1e-12, M_max=1e6)
+        self.assertAlmostEqual(searched.M/closed.M, 1.0, places=4)
+        self.assertAlmostEqual(searched.snr/closed.snr, 1.0, places=6)
+
+
+class TestApdFrontEnd(unittest.TestCase):
+    def setUp(self):
+        self.apd = DemoApd().replace(capacitance=1e-12)
+        self.f = numpy.logspace(3, 8, 20)
+
+    def test_noise(self):
+        q = constants.elementary_charge
+        tia = tiasim.TIA(opamps.OPA818(), self.apd, 10e3)
+        P = 1e-6
+        il = self.apd.responsivity*P
+        idg = self.apd.dark_current()/self.apd.gain
+        zm = numpy.abs(tia.ZM(self.f))
+        shot2 = numpy.square(tia.bright_noise(P, self.f)) - numpy.square(tia.dark_noise(self.f))
+        numpy.testing.assert_allclose(shot2, 2*q*self.apd.gain**2*self.apd.F*il*zm**2, rtol=1e-8)
+        numpy.testing.assert_allclose(tia.diode_dark_noise(self.f), numpy.sqrt(2*q*self.apd.gain**2*self.apd.F*idg)*zm)
+        numpy.testing.assert_allclose(tia.dc_output(P, self.f), (self.apd.gain*il + self.apd.dark_current())*zm)
+        n = tia.noise_breakdown(self.f, P=P)
+        numpy.testing.assert_allclose(n.bright, tia.bright_noise(P, self.f))
+        numpy.testing.assert_allclose(n.diode_dark, tia.diode_dark_noise(self.f))
+        # photodiodes have no dark-current noise
+        pd = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 10e3)
+        self.assertTrue(numpy.all(pd.noise_breakdown(self.f).diode_dark == 0))
+
+    def test_gain_and_temperature_arrays(self):
+        M = numpy.array([10.0, 50.0, 200.0])
+        T = numpy.array([250.0, 300.0])
+        tia = tiasim.TIA(opamps.OPA818(), self.apd.replace(gain=M[:, None, None], temperature=T[None, :, None]), 10e3)
+        self.assertEqual(tia.bright_noise(1e-6, self.f).shape, (3, 2, 20))
+        self.assertEqual(tia.noise_breakdown(self.f, P=1e-6).bright.shape, (3, 2, 20))
+
+        R_F = numpy.array([1e3, 10e3, 100e3])
+        ensemble = tiasim.TIAEnsemble(opamps.OPA818(), self.apd, R_F[:, None, None], M=M[None, :, None], T_D=T[None, None, :])
+        bright = ensemble.bright_noise(1e-6, self.f)
+        self.assertEqual(bright.shape, (3, 3, 2, 20))
+        for i, j, k in [(0, 0, 0), (1, 2, 1), (2, 1, 0)]:
+            single = tiasim.TIA(opamps.OPA818(), self.apd.replace(gain=M[j], temperature=T[k]), R_F[i],
+                                ensemble.C_F[i, j, k] - ensemble.C_F_parasitic[i, j, k])
+            numpy.testing.assert_allclose(bright[i, j, k], single.bright_noise(1e-6, self.f), rtol=1e-10)
+            numpy.testing.assert_allclose(ensemble.dc_output(1e-6, self.f)[i, j, k], single.dc_output(1e-6, self.f), rtol=1e-10)
+            numpy.testing.assert_allclose(ensemble.noise_breakdown(self.f, 1e-6).diode_dark[i, j, k],
+                                          single.diode_dark_noise(self.f), rtol=1e-10)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,39 @@
+import json
+import os
+import unittest
+import numpy
+from tiasim import fit
+from tiasim.opamps import PoleOpamp
+from tiasim.table import read_curve
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+class TestFit(unittest.TestCase):
+    def test_recovers_model(self):
+        f = numpy.logspace(2, 9, 40)
+        A = fit.pole_model(f, 1e5, [2e4, 4e8])
+        AOL_gain, poles, rms = fit.fit_gain(f, numpy.abs(A), f, numpy.degrees(numpy.unwrap(numpy.angle(A))), 2)
+        self.assertAlmostEqual(AOL_gain/1e5, 1.0, places=6)
+        numpy.testing.assert_allclose(poles, [2e4, 4e8], rtol=1e-6)
+
+        noise = fit.noise_model(f, 2e-9, 4e-7, 0.6)
+        numpy.testing.assert_allclose(fit.fit_noise(f, noise)[:3], [2e-9, 4e-7, 0.6], rtol=1e-6)
+
+    def test_parameter_file_reproducible(self):
+        part, parameters = fit.fit_part(os.path.join(examples, "opa818"))
+        with open(PoleOpamp.parameter_file) as f:
+            stored = json.load(f)[part]
+        numpy.testing.assert_allclose(parameters["poles"], stored["poles"], rtol=1e-6)
+        for name in ("voltage_noise", "current_noise"):
+            for key in ("a0", "a1", "n"):
+                self.assertAlmostEqual(parameters[name][key]/stored[name][key], 1.0, places=6)
+
+    def test_pole_opamp(self):
+        opamp = PoleOpamp.from_parameters("OPA818")
+        f, gain_db = read_curve(os.path.join(examples, "opa818", "opa818_AOL_gain.txt"), 1e6)
+        error = 20*numpy.log10(numpy.abs(opamp.gain(f))) - gain_db
+        self.assertLess(numpy.abs(error).max(), 2.0) # two poles, within 2 dB up to 1 GHz
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.instrument import profiling
+
+
+class TestProfiling(unittest.TestCase):
+    def test_counts(self):
+        zm = tiasim.TIA.ZM
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12)
+        f = numpy.logspace(3, 9, 100)
+        with profiling() as profile:
+            tia.ZM(f)
+            tia.dark_noise(f)
+            with self.assertRaises(RuntimeError):
+                profiling().__enter__()
+        self.assertIs(tiasim.TIA.ZM, zm)
+        records = {r.name: r for r in profile.records()}
+        self.assertEqual(records["TIA.ZM"].calls, 3)       # direct, amp_current_noise, johnson_noise
+        self.assertEqual(records["TIA.ZM"].points, 300)
+        self.assertEqual(records["TwoPoleAmplifier.gain"].calls, 1)     # cached response
+        self.assertGreaterEqual(records["TIA.dark_noise"].total, records["TIA.dark_noise"].own)
+        self.assertIn("TIA.dark_noise", profile.table())
+
+    def test_export(self):
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12)
+        with profiling() as profile:
+            tia.bandwidth()
+        with tempfile.TemporaryDirectory() as d:
+            profile.write_pstats(os.path.join(d, "model.prof"))
+            stats = pstats.Stats(os.path.join(d, "model.prof"))
+            names = [function[2] for function in stats.stats]
+            self.assertIn("find_bandwidth", names)
+            profile.write_chrome_trace(os.path.join(d, "trace.json"))
+            with open(os.path.join(d, "trace.json")) as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual(len(events), sum(r.calls for r in profile.records()))
+        self.assertEqual({e["ph"] for e in events}, {"X"})
+
+if __name__ == "__main__":
+    unittest.main()
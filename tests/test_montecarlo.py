@@ -0,0 +1,33 @@
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.montecarlo import monte_carlo, uniform, normal
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 10e3, 0.5e-12)
+        self.tolerances = {"C_F": uniform(0.1), "C_D": normal(0.05), "GBWP": normal(0.1)}
+
+    def test_nominal(self):
+        result = monte_carlo(self.tia, {}, n=10, seed=1, workers=1)
+        self.assertEqual(len(result), 10)
+        for bw in result.samples["bandwidth"]:
+            self.assertAlmostEqual(bw/self.tia.bandwidth(), 1.0, places=5)
+
+    def test_reproducible(self):
+        a = monte_carlo(self.tia, self.tolerances, n=500, seed=3, workers=1, chunk_size=100)
+        b = monte_carlo(self.tia, self.tolerances, n=500, seed=3, workers=2, chunk_size=64)
+        numpy.testing.assert_array_equal(a.samples, b.samples)
+        p = a.percentiles([5, 50, 95])
+        self.assertTrue(numpy.all(numpy.diff(p["bandwidth"]) > 0))
+        counts, edges = a.histogram("peaking", bins=20)
+        self.assertEqual(counts.sum(), 500)
+
+    def test_unknown_component(self):
+        with self.assertRaises(ValueError):
+            monte_carlo(self.tia, {"R_G": uniform(0.1)}, n=10)
+
+if __name__ == "__main__":
+    unittest.main()
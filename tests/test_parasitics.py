@@ -0,0 +1,40 @@
+import unittest
+import numpy
+import tiasim
+from tiasim.ensemble import TIAEnsemble
+from tiasim.parasitics import SpectrumModel, fit_parasitics
+
+
+class TestParasitics(unittest.TestCase):
+    def setUp(self):
+        self.opamp = tiasim.opamps.OPA818()
+        self.diode = tiasim.photodiodes.FDS015()
+        self.tia = tiasim.TIA(self.opamp, self.diode, 1.2e3, 0.75e-12, 0.01e-12)
+        self.f = numpy.linspace(0, 2.1e9, 751)
+        self.P = [0.0, 2e-6]
+
+    def test_jacobian(self):
+        model = SpectrumModel(self.tia, self.f[1:], 1e6, self.P)
+        x = numpy.log([0.2e-12, 4e-12, 0.7, 6e8])
+        dbm, jac = model.dbm_and_jacobian(*numpy.exp(x))
+        for k in range(4):
+            step = numpy.zeros(4)
+            step[k] = 1e-6
+            numeric = (model.dbm_and_jacobian(*numpy.exp(x + step))[0] - dbm)/1e-6
+            numpy.testing.assert_allclose(numeric, jac[..., k], atol=1e-4)
+
+    def test_recovers_parasitics(self):
+        C_tot, C_F_parasitic, gain_scale, f_load = 1.3*self.tia.C_tot, 0.2e-12, 0.7, 6e8
+        tia = TIAEnsemble(self.opamp, self.diode, 1.2e3, 0.75e-12, C_F_parasitic,
+                          C_D=C_tot - self.opamp.input_capacitance(), gain_scale=gain_scale)
+        f = self.f[1:]
+        load = numpy.abs(1.0/(1.0 + 1j*f/f_load))
+        data = [numpy.r_[-50.0, tiasim.v_to_dbm(tia.bright_noise(P, f)*load, RBW=1e6)] for P in self.P]
+        result = fit_parasitics(self.tia, self.f, data, 1e6, self.P)
+        self.assertTrue(result.success)
+        numpy.testing.assert_allclose(result[:4], [C_F_parasitic, C_tot, gain_scale, f_load], rtol=1e-6)
+        self.assertLess(result.rms, 1e-6)
+        self.assertEqual(result.dbm.shape, (2, 751))
+
+if __name__ == "__main__":
+    unittest.main()
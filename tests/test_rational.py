@@ -0,0 +1,45 @@
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.rational import RationalTransfer
+
+trapezoid = getattr(numpy, "trapezoid", None) or numpy.trapz
+
+
+class TestRationalTransfer(unittest.TestCase):
+    def test_second_order(self):
+        # H = 1/(1 + s/(w Q) + s^2/w^2), Q = 1: peak at f0 sqrt(1 - 1/(2 Q^2)), ENBW pi Q f0/2
+        f0 = 1e6
+        H = RationalTransfer([1.0], [1.0, 1.0, 1.0], 2*numpy.pi*f0)
+        self.assertAlmostEqual(H.peak().f/(f0*numpy.sqrt(0.5)), 1.0, places=9)
+        self.assertAlmostEqual(H.peak().magnitude, 2/numpy.sqrt(3), places=9)
+        self.assertAlmostEqual(H.enbw()/(numpy.pi*f0/2), 1.0, places=9)
+        self.assertAlmostEqual(abs(H(H.bandwidth())), numpy.sqrt(0.5), places=9)
+        self.assertAlmostEqual(H.power(0.0, 1e3*f0)/H.power(), 1.0, places=3)
+        numpy.testing.assert_allclose(H.step_response([0.0, 1.0]), [0.0, 1.0], atol=1e-12)
+
+    def test_tia(self):
+        for opamp in (opamps.OPA855(), opamps.OPA657(), opamps.PoleOpamp.from_parameters("OPA818")):
+            tia = tiasim.TIA(opamp, photodiodes.FDS015(), 10e3, 0.2e-12)
+            ZM, Avcl = tia.transfer_functions()
+            f = numpy.logspace(2, 10, 50)
+            numpy.testing.assert_allclose(ZM(f), tia.ZM(f), rtol=1e-12)
+            numpy.testing.assert_allclose(Avcl(f), tia.response(f)["Avcl"], rtol=1e-12)
+            self.assertAlmostEqual(ZM.bandwidth()/tia.bandwidth(), 1.0, places=5)
+            self.assertAlmostEqual(ZM.enbw()/tia.enbw(), 1.0, places=4)
+            f = numpy.linspace(1e6, 1e8, 100001)
+            self.assertAlmostEqual(ZM.power(1e6, 1e8)/trapezoid(numpy.abs(tia.ZM(f))**2, f), 1.0, places=6)
+            t = numpy.linspace(0, 2e-7, 8192)
+            numpy.testing.assert_allclose(ZM.step_response(t), tia.step_response(t), atol=1e-3*tia.R_F)
+
+    def test_no_pole_model(self):
+        f = numpy.logspace(3, 9, 20)
+        A = opamps.OPA818().gain(f)
+        noise = (f, numpy.full(len(f), 1e-9))
+        opamp = opamps.TabulatedOpamp((f, numpy.abs(A)), (f, numpy.degrees(numpy.angle(A))), noise, noise, 2.4e-12)
+        with self.assertRaises(ValueError):
+            tiasim.TIA(opamp, photodiodes.FDS015(), 1e3, 1e-12).transfer_functions()
+
+if __name__ == "__main__":
+    unittest.main()
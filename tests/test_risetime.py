@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy
+from tiasim import risetime
+
+
+class TestRiseTime(unittest.TestCase):
+    def setUp(self):
+        self.x = numpy.linspace(0, 1e-6, 10000)
+        self.y = 1.0/(1.0 + numpy.exp(-(self.x - 5e-7)/2e-8))
+        # 10-90% time of a logistic edge
+        self.expected = 2*numpy.log(9.0)*2e-8
+
+    def test_rise_and_fall(self):
+        self.assertAlmostEqual(risetime.find_rise_time(self.x, self.y)/self.expected, 1.0, places=3)
+        self.assertAlmostEqual(risetime.find_rise_time(self.x, self.y[::-1])/self.expected, 1.0, places=3)
+        self.assertGreater(risetime.calc_slew_rate(self.x, self.y), 0)
+        self.assertLess(risetime.calc_slew_rate(self.x, self.y[::-1]), 0)
+
+    def test_batch(self):
+        noise = numpy.random.default_rng(0).normal(0, 0.01, (6, len(self.x)))
+        traces = numpy.vstack([self.y, self.y[::-1]]*3) + noise
+        m = risetime.analyze_edges(self.x, traces)
+        for i, trace in enumerate(traces):
+            rising = i % 2 == 0
+            single = risetime.find_rise_time(self.x, trace)
+            self.assertEqual(single, m.rise_time[i] if rising else m.fall_time[i])
+            self.assertTrue(numpy.isnan(m.fall_time[i] if rising else m.rise_time[i]))
+            self.assertEqual(risetime.calc_slew_rate(self.x, trace), m.slew_rate[i])
+        numpy.testing.assert_array_equal(risetime.analyze_edges(numpy.broadcast_to(self.x, traces.shape), traces).slew_rate,
+                                         m.slew_rate)
+
+    def test_block_peaks_match_scan(self):
+        # rows up to _whole_rows samples are searched through block peaks, longer ones by the
+        # early-stopping block scan: both find the same first samples, also with nan samples
+        rng = numpy.random.default_rng(1)
+        traces = numpy.vstack([self.y, self.y[::-1]]*4) + rng.normal(0, 0.05, (8, len(self.x)))
+        traces[rng.random(traces.shape) < 0.01] = numpy.nan
+        peaks = risetime.analyze_edges(self.x, traces)
+        with mock.patch.object(risetime, "_whole_rows", 0):
+            scan = risetime.analyze_edges(self.x, traces)
+        for a, b in zip(peaks, scan):
+            numpy.testing.assert_array_equal(a, b)
+
+    def test_no_step(self):
+        self.assertTrue(numpy.isnan(risetime.find_rise_time(self.x, numpy.ones_like(self.x))))
+        self.assertTrue(numpy.isnan(risetime.get_first_higher_value(2.0, self.x, self.y)))
+
+    def test_step_metrics(self):
+        t = numpy.linspace(0, 10, 10001)
+        y = 1 - numpy.exp(-t)
+        m = risetime.step_metrics(t, numpy.vstack([y, 2*y]), final=[1.0, 2.0])
+        numpy.testing.assert_allclose(m.rise_time, numpy.log(9.0), rtol=1e-5)
+        numpy.testing.assert_allclose(m.settling_time, numpy.log(50.0), rtol=1e-3)
+
+class TestStreamingEdges(unittest.TestCase):
+    def setUp(self):
+        dt = 1e-9
+        t = numpy.arange(2000)*dt
+        period = 1/(1 + numpy.exp(-(t - 0.5e-6)/2e-8)) - 1/(1 + numpy.exp(-(t - 1.5e-6)/2e-8))
+        self.dt = dt
+        self.samples = numpy.round(numpy.tile(period, 50)*1000).astype(numpy.int16)
+
+    def test_file_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.bin")
+            self.samples.tofile(path)
+            edges = list(risetime.iter_edges(path, self.dt, scale=1e-3, levels=(0, 1), chunk_size=777, overlap=300))
+        self.assertEqual(len(edges), 100)
+        numpy.testing.assert_array_equal(numpy.diff([e.index for e in edges]) > 900, True)
+        rise = [e.rise_time for e in edges[::2]]
+        fall = [e.fall_time for e in edges[1::2]]
+        numpy.testing.assert_allclose(rise, 2*numpy.log(9.0)*2e-8, rtol=0.02)
+        numpy.testing.assert_allclose(fall, 2*numpy.log(9.0)*2e-8, rtol=0.02)
+        self.assertTrue(all(e.slew_rate > 0 for e in edges[::2]))
+        self.assertTrue(all(e.slew_rate < 0 for e in edges[1::2]))
+
+    def test_chunking_invariant(self):
+        whole = list(risetime.iter_edges(self.samples, self.dt, chunk_size=len(self.samples)))
+        chunked = list(risetime.iter_edges(self.samples, self.dt, levels=(0, 1000), chunk_size=1234, overlap=500))
+        self.assertEqual([e.index for e in whole], [e.index for e in chunked])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from tiasim import v_to_dbm
+from tiasim.spectrum import read_spectrum, load_spectra, SpectrumAnalyzer
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+class TestSpectrum(unittest.TestCase):
+    def test_read(self):
+        path = os.path.join(examples, "opa818", "OPA818_FDS015_1k2_0p7.csv")
+        s = read_spectrum(path)
+        self.assertEqual(s.metadata.machine, "SSA3021X")
+        self.assertEqual(s.metadata.rbw, 1e6)
+        self.assertEqual(s.metadata.impedance, 50.0)
+        self.assertEqual(s.metadata.span, 2.1e9)
+        self.assertTrue(s.metadata.preamp)
+        self.assertEqual(s.metadata.comments[0], "One Inch Photodetector")
+        self.assertEqual(s.traces.shape, (4, s.metadata.n_points))
+        d = numpy.genfromtxt(path, comments="#", delimiter=",")
+        numpy.testing.assert_array_equal(s.frequency, d[:, 0])
+        numpy.testing.assert_array_equal(s.traces, d[:, 1:].T)
+
+    def test_load_directory(self):
+        source = os.path.join(examples, "example_10kOhm", "OPA657_S5793_10kOhm.csv")
+        with tempfile.TemporaryDirectory() as d:
+            for k in range(3):
+                shutil.copy(source, os.path.join(d, "unit%d.csv" % k))
+            inline = load_spectra(d, workers=1)
+            pooled = load_spectra(d, workers=2)
+        self.assertEqual(inline.traces.shape, (3, 4, 751))
+        numpy.testing.assert_array_equal(inline.traces, pooled.traces)
+        self.assertEqual([m.rbw for m in inline.metadata], [10e3]*3)
+
+class TestSpectrumAnalyzer(unittest.TestCase):
+    def test_flat_noise(self):
+        # white noise reads 10 log10(1.0645) dB above v_to_dbm() through the Gaussian RBW
+        f = numpy.linspace(10e6, 100e6, 181)
+        v = 1e-8
+        for rbw in (1e6, 3e3):     # direct and FFT convolution
+            sa = SpectrumAnalyzer(f, rbw, log_average=False)
+            d = sa.display(lambda x: v*numpy.ones_like(x))
+            numpy.testing.assert_allclose(d, v_to_dbm(v, rbw) + 6.0 - 6.0206 + 10*numpy.log10(1.0645), atol=0.01)
+        sa = SpectrumAnalyzer(f, 1e6, vbw=1e5, sweep_time=0.1)
+        d = sa.display(lambda x: v*numpy.ones_like(x))
+        numpy.testing.assert_allclose(d, v_to_dbm(v, 1e6) + 6.0 - 6.0206 + 10*numpy.log10(1.0645) - 2.51, atol=0.01)
+
+    def test_floor(self):
+        path = os.path.join(examples, "opa818", "OPA818_FDS015_1k2_0p7.csv")
+        s = read_spectrum(path)
+        sa = SpectrumAnalyzer.from_metadata(s.metadata, floor=s.traces[0], log_bias=0.0)
+        self.assertEqual(sa.rbw, 1e6)
+        d = sa.display(lambda x: numpy.zeros_like(x))
+        numpy.testing.assert_allclose(d, s.traces[0], atol=1e-9)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.stability import quality_factor
+
+
+class TestStability(unittest.TestCase):
+    def test_tia(self):
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.7e-12)
+        s = tia.stability()
+        self.assertAlmostEqual(abs(tia.loop_gain(s.f_crossover)), 1.0, places=6)
+        phase = numpy.degrees(numpy.angle(tia.loop_gain(s.f_crossover)))
+        self.assertAlmostEqual(s.phase_margin, 180.0 + phase, places=6)
+        self.assertTrue(s.stable)
+
+        f = numpy.geomspace(s.f_crossover/30, s.f_crossover*30, 100001)
+        av = numpy.abs(tia.response(f)["Avcl"])
+        self.assertAlmostEqual(s.noise_gain_peak/av.max(), 1.0, places=6)
+        self.assertAlmostEqual(s.f_noise_peak/f[av.argmax()], 1.0, places=3)
+
+    def test_ensemble(self):
+        R_F = numpy.array([1e3, 1e4, 1e5])
+        ensemble = tiasim.TIAEnsemble(opamps.OPA818(), photodiodes.FDS015(), R_F[:, None], [0.0, numpy.nan])
+        s = ensemble.stability()
+        self.assertEqual(s.phase_margin.shape, (3, 2))
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), R_F[1])
+        self.assertAlmostEqual(s.phase_margin[1, 1], tia.phase_margin(), places=5)
+        # the optimum C_F is stable, the bare parasitic is not at low R_F
+        self.assertTrue(numpy.all(s.stable[:, 1]))
+        self.assertFalse(s.stable[0, 0])
+        self.assertTrue(numpy.all(numpy.isinf(s.Q[~s.stable])))
+
+    def test_quality_factor(self):
+        # Butterworth two-pole loop: PM 65.5 degrees, Q = 1/sqrt(2)
+        self.assertAlmostEqual(float(quality_factor(65.53)), 1/numpy.sqrt(2), places=3)
+        self.assertAlmostEqual(float(quality_factor(90.0)), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+import numpy
+import tiasim
+from tiasim.ensemble import TIAEnsemble
+from tiasim.station import screen_units
+
+
+def write_unit(path, tia, C_F_parasitic, gain_scale, f):
+    unit = TIAEnsemble(tia.opamp, tia.diode, tia.R_F, tia.C_F - tia.C_F_parasitic, C_F_parasitic, gain_scale=gain_scale)
+    dark = tiasim.v_to_dbm(unit.dark_noise(f), RBW=1e6)
+    with open(path, "w") as out:
+        out.write("#Machine Module,SSA3021X\n#RBW,1000000.000000,Manual\n#Trace Data\n")
+        for row in zip(f, numpy.full(len(f), -130.0), dark):
+            out.write("%e,%e,%e\n" % row)
+
+
+class TestStation(unittest.TestCase):
+    def test_flags_outlier(self):
+        tia = tiasim.TIA(tiasim.opamps.OPA818(), tiasim.photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        f = numpy.linspace(2.8e6, 2.1e9, 200)
+        with tempfile.TemporaryDirectory() as d:
+            for k, (C_F_parasitic, gain_scale) in enumerate([(0.01e-12, 1.0), (0.02e-12, 0.9), (0.3e-12, 1.0)]):
+                write_unit(os.path.join(d, "unit%d.csv" % k), tia, C_F_parasitic, gain_scale, f)
+            limits = {"C_F_parasitic": (0.0, 0.1e-12), "gain_scale": (0.8, 1.2)}
+            results = screen_units(d, tia, limits=limits, floor_trace=0, workers=1,
+                                   summary=os.path.join(d, "summary.txt"))
+            with open(os.path.join(d, "summary.txt")) as summary:
+                self.assertEqual(len(summary.readlines()), 4)
+        numpy.testing.assert_allclose(results["C_F_parasitic"], [0.01e-12, 0.02e-12, 0.3e-12], rtol=1e-4)
+        numpy.testing.assert_allclose(results["gain_scale"], [1.0, 0.9, 1.0], rtol=1e-4)
+        self.assertEqual(list(results["outlier"]), [False, False, True])
+        self.assertIn("C_F_parasitic", results["reason"][2])
+        self.assertLess(results["bandwidth"][2], results["bandwidth"][0])
+
+if __name__ == "__main__":
+    unittest.main()
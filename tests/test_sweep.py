@@ -0,0 +1,34 @@
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+from tiasim.sweep import sweep, catalog
+
+
+class TestSweep(unittest.TestCase):
+    def test_catalog(self):
+        names = [type(o).__name__ for o in catalog(opamps, tiasim.Opamp)]
+        self.assertIn("OPA818", names)
+        self.assertNotIn("IdealOpamp", names)
+
+    def test_sweep_matches_tia(self):
+        progress = []
+        R_F = [1e3, 1e4, 1e5]
+        results = sweep([opamps.OPA818(), opamps.OPA847()], [photodiodes.FDS015()], R_F, [numpy.nan, 0.5e-12],
+                        workers=1, chunk_size=5, callback=lambda done, total: progress.append((done, total)))
+        self.assertEqual(len(results), 12)
+        self.assertEqual(progress[-1], (12, 12))
+        row = results[3]
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), R_F[1], 0.5e-12)
+        self.assertEqual(row["opamp"], "OPA818")
+        self.assertEqual(row["R_F"], R_F[1])
+        self.assertAlmostEqual(row["bandwidth"]/tia.bandwidth(), 1.0, places=5)
+
+    def test_process_pool(self):
+        args = ([opamps.OPA818()], [photodiodes.FDS015(), photodiodes.S5971()], numpy.logspace(3, 5, 7))
+        inline = sweep(*args, workers=1, chunk_size=4)
+        pooled = sweep(*args, workers=2, chunk_size=4)
+        numpy.testing.assert_array_equal(inline, pooled)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+import numpy
+import tiasim
+from tiasim.opamps import TabulatedOpamp
+from tiasim.table import LogTable, load_table, read_curve
+
+examples = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+class TestLogTable(unittest.TestCase):
+    def test_index_matches_binary_search(self):
+        rng = numpy.random.default_rng(0)
+        x = numpy.sort(rng.uniform(1.0, 1e6, 40))
+        table = LogTable(x, rng.uniform(1.0, 2.0, 40))
+        u = numpy.log(numpy.concatenate([rng.uniform(1.0, 1e6, 10000), x, numpy.nextafter(x, 0)]))
+        u = numpy.clip(u, table._u[0], table._u[-1])
+        expected = numpy.clip(numpy.searchsorted(table._u, u, side="right") - 1, 0, len(x)-2)
+        numpy.testing.assert_array_equal(table.segment(u), expected)
+
+    def test_log_log(self):
+        table = LogTable([1e3, 1e5], [1e-6, 1e-8], extrapolate=(False, True))
+        self.assertAlmostEqual(table(1e4)/1e-7, 1.0)
+        self.assertAlmostEqual(table(1e6)/1e-9, 1.0)
+        self.assertAlmostEqual(table(10.0)/1e-6, 1.0)
+        self.assertEqual(table(numpy.ones((2, 3))).shape, (2, 3))
+
+
+class TestLoadTable(unittest.TestCase):
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "curve.txt")
+            with open(path, "w") as f:
+                f.write("# X Hz\n1.0, 2.0\n3.0\t4.0\n")
+            first = load_table(path)
+            self.assertNotIsInstance(first, numpy.memmap)
+            second = load_table(path)
+            self.assertIsInstance(second, numpy.memmap)
+            numpy.testing.assert_array_equal(first, second)
+            self.assertFalse(first.flags.writeable)
+            self.assertFalse(second.flags.writeable)
+
+            os.utime(path, ns=(0, 0))
+            self.assertIsInstance(load_table(path), numpy.memmap)
+
+            with open(path, "w") as f:
+                f.write("5 6\n7 8\n9 10\n")
+            numpy.testing.assert_array_equal(load_table(path)[:, 0], [5, 7, 9])
+
+
+class TestTabulatedOpamp(unittest.TestCase):
+    def setUp(self):
+        d = os.path.join(examples, "opa818")
+        self.files = [os.path.join(d, name) for name in
+                      ("opa818_AOL_gain.txt", "opa818_AOL_phase.txt", "opa818_vn.txt", "opa818_in.txt")]
+        self.opamp = TabulatedOpamp.from_files(*self.files, input_capacitance=2.4e-12, f_scale=1e6)
+
+    def test_matches_datasheet(self):
+        f, gain_db = read_curve(self.files[0], 1e6)
+        numpy.testing.assert_allclose(20*numpy.log10(numpy.abs(self.opamp.gain(f))), gain_db, rtol=1e-12)
+        f, phase = read_curve(self.files[1], 1e6)
+        numpy.testing.assert_allclose(numpy.degrees(numpy.unwrap(numpy.angle(self.opamp.gain(f)))), phase, atol=1e-9)
+        f, vn = read_curve(self.files[2], 1e6, 1e-9)
+        numpy.testing.assert_allclose(self.opamp.voltage_noise(f), vn, rtol=1e-12)
+
+    def test_tia(self):
+        diode = tiasim.photodiodes.FDS015()
+        bw_model = tiasim.TIA(tiasim.opamps.OPA818(), diode, 10e3, 0.5e-12).bandwidth()
+        bw_table = tiasim.TIA(self.opamp, diode, 10e3, 0.5e-12).bandwidth()
+        self.assertAlmostEqual(bw_table/bw_model, 1.0, places=1)
+
+if __name__ == "__main__":
+    unittest.main()
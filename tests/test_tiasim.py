@@ -0,0 +1,174 @@
+import pickle
+import unittest
+import numpy
+import tiasim
+from tiasim import opamps, photodiodes
+
+
+class TestBandwidth(unittest.TestCase):
+    def setUp(self):
+        self.tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+
+    def test_bandwidth_matches_dense_grid(self):
+        f = numpy.logspace(1, 10, int(1e6))
+        zm = numpy.abs(self.tia.ZM(f))
+        f_grid = f[numpy.flatnonzero(zm < zm[0]/numpy.sqrt(2.0))[0]]
+        self.assertLess(abs(self.tia.bandwidth() - f_grid)/f_grid, 10**(9/1e6) - 1)
+
+    def test_bandwidth_not_found(self):
+        solution = self.tia.bandwidth_solution(f_max=1e6)
+        self.assertFalse(solution.found)
+        self.assertTrue(numpy.isnan(solution.f_3dB))
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        self.f = numpy.logspace(3, 9, 200)
+
+    def test_reuse(self):
+        self.tia.bright_noise(1e-6, self.f)
+        info = self.tia.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 3)
+
+    def test_replace(self):
+        zm = self.tia.ZM(self.f)
+        with self.assertRaises(AttributeError):
+            self.tia.R_F = 2.4e3
+        other = self.tia.replace(R_F=2.4e3)
+        self.assertEqual(other.C_F, self.tia.C_F)
+        self.assertFalse(numpy.allclose(other.ZM(self.f), zm))
+        self.assertEqual(other.cache_info().misses, 1)
+        self.assertEqual(self.tia.cache_info().misses, 1)
+
+    def test_memory_bound(self):
+        self.tia.response_cache.max_bytes = 25000
+        for n in (100, 200, 300):
+            self.tia.ZM(numpy.logspace(3, 9, n))
+        info = self.tia.cache_info()
+        self.assertLessEqual(info.nbytes, info.max_bytes)
+        self.assertEqual(info.entries, 1)
+
+class TestValueTypes(unittest.TestCase):
+    def test_equality(self):
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        same = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        self.assertEqual(tia, same)
+        self.assertEqual(hash(tia), hash(same))
+        self.assertEqual(len({tia, same, tia.replace(R_F=1e3)}), 2)
+        self.assertNotEqual(opamps.OPA818(), opamps.OPA657())
+        self.assertEqual(tia.replace(diode=tia.diode.replace(capacitance=2e-12)).C_tot,
+                         2e-12 + tia.opamp.input_capacitance())
+        with self.assertWarns(FutureWarning):
+            self.assertEqual(tia.set_CF().C_F, tia.optimal_CF())
+        with self.assertRaises(TypeError):
+            tia.replace(R=1.0)
+        with self.assertRaises(AttributeError):
+            tia.opamp._GBWP = 1e9
+        self.assertFalse(hasattr(tia.opamp, "__dict__"))
+
+    def test_replace_keeps_C_F_as_given(self):
+        tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        self.assertEqual(tia.replace(), tia)
+        self.assertEqual(tia.replace(R_F=10e3).C_F, tia.C_F)
+        optimum = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3)
+        self.assertEqual(optimum.replace(), optimum)
+        self.assertEqual(optimum.replace(R_F=10e3).C_F, optimum.replace(R_F=10e3).optimal_CF())
+        zero = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.0)
+        self.assertEqual(zero.C_F, zero.C_F_parasitic)
+        self.assertEqual(zero.replace(R_F=100e3).C_F, zero.C_F_parasitic)
+
+    def test_pickle(self):
+        tia = tiasim.TIA(opamps.PoleOpamp.from_parameters("OPA818"), photodiodes.FDS015(), 1.2e3)
+        tia.ZM(numpy.logspace(3, 9, 10))
+        copy = pickle.loads(pickle.dumps(tia))
+        self.assertEqual(copy, tia)
+        self.assertEqual(copy.cache_info().entries, 0)
+        with self.assertRaises(AttributeError):
+            copy.R_F = 1.0
+
+class TestNoiseBreakdown(unittest.TestCase):
+    def setUp(self):
+        self.tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+        self.f = numpy.logspace(3, 9, 200)
+
+    def test_matches_individual_methods(self):
+        P = 1e-5
+        n = self.tia.noise_breakdown(self.f, P=P)
+        numpy.testing.assert_allclose(n.amp_current, self.tia.amp_current_noise(self.f))
+        numpy.testing.assert_allclose(n.amp_voltage, self.tia.amp_voltage_noise(self.f))
+        numpy.testing.assert_allclose(n.johnson, self.tia.johnson_noise(self.f))
+        numpy.testing.assert_allclose(n.shot, self.tia.shot_noise(P, self.f))
+        numpy.testing.assert_allclose(n.dark, self.tia.dark_noise(self.f))
+        numpy.testing.assert_allclose(n.bright, self.tia.bright_noise(P, self.f))
+
+    def test_output_buffers(self):
+        out = self.tia.noise_breakdown(self.f)
+        n = self.tia.noise_breakdown(self.f, P=1e-6, out=out)
+        self.assertIs(n.bright, out.bright)
+
+class TestIntegratedNoise(unittest.TestCase):
+    def setUp(self):
+        self.tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), 1.2e3, 0.75e-12, 0.01e-12)
+
+    def test_matches_dense_grid(self):
+        n = self.tia.integrated_noise(1e3, 1e9, P=1e-5, rtol=1e-5)
+        f = numpy.linspace(1e3, 1e9, int(1e6))
+        dense = self.tia.noise_breakdown(f, P=1e-5)
+        for name in ("johnson", "dark", "bright"):
+            rms = numpy.sqrt(numpy.sum(numpy.diff(f)*0.5*(getattr(dense, name)[1:]**2 + getattr(dense, name)[:-1]**2)))
+            self.assertAlmostEqual(getattr(n, name)/rms, 1.0, places=4)
+        self.assertLess(len(n.f), 1000)
+        self.assertAlmostEqual(n.cumulative[-1], n.bright)
+
+    def test_array_arguments(self):
+        n = self.tia.integrated_noise(1e3, 1e9, P=numpy.array(1e-5))
+        self.assertEqual(self.tia.integrated_noise(1e3, 1e9, P=numpy.array(1e-5)).bright, n.bright)
+        with self.assertRaises(ValueError):
+            self.tia.integrated_noise(1e3, 1e9, P=numpy.array([0.0, 1e-5]))
+        self.assertEqual(self.tia.enbw(rtol=numpy.float64(1e-4)), self.tia.enbw())
+
+    def test_enbw(self):
+        f = numpy.linspace(1.0, 1e11, int(1e6))
+        zm2 = numpy.abs(self.tia.ZM(f))**2
+        dense = numpy.sum(numpy.diff(f)*0.5*(zm2[1:] + zm2[:-1]))/zm2[0]
+        self.assertAlmostEqual(self.tia.noise_bandwidth()/dense, 1.0, places=4)
+
+class TestStepResponse(unittest.TestCase):
+    def test_single_pole(self):
+        # ideal opamp: ZM is a single R_F*C_F pole, 10-90% rise time 2.2*R_F*C_F
+        opamp = tiasim.IdealOpamp(1e5, 1e6, 1e11)
+        tia = tiasim.TIA(opamp, photodiodes.FDS015(), 10e3, 1e-12, 0.01e-12)
+        m = tia.rise_time()
+        tau = tia.R_F*tia.C_F
+        self.assertAlmostEqual(m.rise_time/(numpy.log(9.0)*tau), 1.0, places=2)
+        self.assertLess(m.overshoot, 1e-3)
+        self.assertAlmostEqual(m.settling_time/(numpy.log(50.0)*tau), 1.0, places=1)
+        self.assertAlmostEqual(tiasim.tiasim.estimate_rise_time_from_bandwidth(tia.bandwidth())/m.rise_time, 1.0, places=1)
+
+    def test_ensemble_batch(self):
+        ensemble = tiasim.TIAEnsemble(opamps.OPA818(), photodiodes.FDS015(), [1e3, 1e4, 1e5])
+        t = tiasim.tiasim.step_time_grid(ensemble.bandwidth())
+        m = ensemble.rise_time(t)
+        for i, r in enumerate(ensemble.R_F):
+            tia = tiasim.TIA(opamps.OPA818(), photodiodes.FDS015(), r, ensemble.C_F[i] - 0.01e-12, 0.01e-12)
+            self.assertAlmostEqual(tia.rise_time(t).rise_time, m.rise_time[i])
+
+class TestEnsemble(unittest.TestCase):
+    def test_matches_tia(self):
+        opamp = opamps.OPA818()
+        C_D = numpy.array([0.5e-12, 2e-12, 10e-12])
+        R_F = numpy.array([[1e3], [1e5]])
+        ensemble = tiasim.TIAEnsemble(opamp, photodiodes.S5971(), R_F, 0.2e-12, 0.01e-12, C_D=C_D)
+        f = numpy.logspace(3, 9, 50)
+        self.assertEqual(ensemble.ZM(f).shape, (2, 3, 50))
+        bw = ensemble.bandwidth()
+        for i, r in enumerate(R_F[:, 0]):
+            for j, c in enumerate(C_D):
+                diode = photodiodes.S5971().replace(capacitance=c)
+                tia = tiasim.TIA(opamp, diode, r, 0.2e-12, 0.01e-12)
+                numpy.testing.assert_allclose(ensemble.noise_breakdown(f, 1e-6).bright[i, j], tia.bright_noise(1e-6, f))
+                self.assertAlmostEqual(bw[i, j]/tia.bandwidth(), 1.0, places=5)
+
+if __name__ == "__main__":
+    unittest.main()
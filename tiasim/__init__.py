@@ -1,6 +1,15 @@
 from . import *
 from . tiasim import Opamp, Photodiode, TIA, v_to_dbm, calc_feedback_transimpedance, calc_closed_loop_transimpedance
+from . tiasim import BandwidthSolution, NoiseBreakdown, IntegratedNoise, find_bandwidth
+from . ensemble import TIAEnsemble
+from . avalanche_photodiode import AvalanchePhotodiode
+from . stability import Stability
+from . rational import RationalTransfer
+from . table import load_table
+from . spectrum import read_spectrum, SpectrumAnalyzer
 from . import opamps
 from . import photodiodes
 from .opamps import IdealOpamp
 
+from . import instrument
+instrument.enable_from_environment()
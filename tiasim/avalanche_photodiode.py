@@ -1,8 +1,20 @@
-import math
+import collections
+import numpy
 from scipy import constants
 from .tools import *
+from .frozen import Frozen
+from .stability import golden_max
+
+OptimalGain = collections.namedtuple("OptimalGain", ["M", "snr", "F"])
+OptimalGain.__doc__ = """
+    SNR-maximizing APD gain, see optimal_apd_gain()
+    M: optimal multiplication gain within the bounds
+    snr: calculate_apd_snr() at M
+    F: excess noise factor at M
+"""
 
 def calc_excess_noise_factor(k, M):
+    """ McIntyre excess noise factor F = k M + (2 - 1/M)(1 - k), k and M broadcast """
     return M*k+(2-1/M)*(1-k)
 
 '''Calculate the diodes effective photosensitive area'''
@@ -13,10 +25,52 @@ def calculate_apd_snr(il, t, M, B, F, R, dark_current):
     '''
     Calculate the SNR floor of an APD with primary photocurrent il, at temperature t, gain M, bandwidth B, excess noise factor F, feedback resistor R,
     and thermally generated carriers idg
+    All arguments are broadcast against each other, e.g. M[:, None] and il[None, :] give an SNR map.
     '''
     k_B = constants.k
     q = constants.elementary_charge
-    return M*il/(math.sqrt(4*k_B*t/R + 2*q*M**2*F*B*il + dark_current))
+    return M*il/(numpy.sqrt(4*k_B*t/R + 2*q*M**2*F*B*il + dark_current))
+
+def optimal_apd_gain(il, t, k, B, R, dark_current, M_min=1.0, M_max=1e4, rtol=1e-9):
+    '''
+    Gain M that maximizes calculate_apd_snr() with F = calc_excess_noise_factor(k, M), as an OptimalGain.
+    With b = 2 q B il and c = 4 k_B t/R + dark_current, d(SNR^2)/dM = 0 reduces to
+        b k M^3 + b (1-k) M - 2c = 0
+    which for 0 <= k < 1 has a single real root, positive. It is taken in the hyperbolic form of
+    Cardano's formula, M = 2 sqrt(p/3) sinh(asinh(3 sqrt(3) c/(b k p^1.5))/3) with p = (1-k)/k,
+    which does not cancel when the linear term dominates, and clipped to [M_min, M_max]
+    (the SNR rises below the root and falls above it).
+    Without signal (il = 0) the SNR is 0 at any gain and M is M_min. Other elements without a
+    finite root (k >= 1, non-finite input) fall back to a golden-section search in ln M between
+    the bounds. All arguments broadcast against each other.
+    '''
+    k_B = constants.k
+    q = constants.elementary_charge
+    il, t, k, B, R, dark_current = [numpy.asarray(x, dtype=float) for x in (il, t, k, B, R, dark_current)]
+    b = 2*q*B*il
+    c = 4*k_B*t/R + dark_current
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        p = (1-k)/k
+        x = (c/b)*(3*numpy.sqrt(3)/(k*p**1.5))
+        M = numpy.sinh(numpy.arcsinh(x)/3)*(2*numpy.sqrt(p/3))
+        if not numpy.all(k > 0):
+            M = numpy.where(k > 0, M, 2*c/(b*(1-k)))
+    M = numpy.array(numpy.broadcast_to(M, numpy.broadcast_shapes(M.shape, B.shape, R.shape)))
+    solved = numpy.isfinite(M) & (M > 0)
+    if not numpy.all(b > 0):
+        dark = numpy.broadcast_to(b == 0, M.shape)
+        M[dark] = M_min
+        solved |= dark
+    numpy.clip(M, M_min, M_max, out=M)
+    if not numpy.all(solved):
+        il_, t_, k_, B_, R_, dark_ = [numpy.broadcast_to(v, M.shape)[~solved] for v in (il, t, k, B, R, dark_current)]
+        snr = lambda m: numpy.nan_to_num(calculate_apd_snr(il_, t_, m, B_, calc_excess_noise_factor(k_, m), R_, dark_),
+                                         nan=-numpy.inf)
+        bound = numpy.ones(il_.shape)
+        M[~solved] = golden_max(snr, M_min*bound, M_max*bound, rtol)
+    M = M[()]
+    F = calc_excess_noise_factor(k, M)
+    return OptimalGain(M, calculate_apd_snr(il, t, M, B, F, R, dark_current), F)
 
 def estimate_thermal_carrier_currents(t, noise_bw, dark_measurement_bw, dark_current, t_dark_current):
     '''
@@ -24,19 +78,30 @@ def estimate_thermal_carrier_currents(t, noise_bw, dark_measurement_bw, dark_cur
     Then take the dark current to be purely a fermi-dirac distribution, remove the temperature
     dependace to get the number of carriers extrapolated to 0k.
     The use that to calculate the number of carriers at whatever current we're looking at
+    All arguments broadcast. Raises ValueError for non-positive temperatures or dark current.
     '''
     t_0 = t_dark_current
-    idg_t0_sq = pow(dark_current, 2) * noise_bw/dark_measurement_bw
+    idg_t0_sq = numpy.square(dark_current) * noise_bw/dark_measurement_bw
     idg_0_sq = idg_t0_sq/fermi_dirac_dist(t_0)
-    assert idg_0_sq > idg_t0_sq
+    if not numpy.all(idg_0_sq > idg_t0_sq):
+        raise ValueError("dark current and its bandwidths must be positive")
     idg_sq = idg_0_sq*fermi_dirac_dist(t)
-    idg = math.sqrt(idg_sq)
+    idg = numpy.sqrt(idg_sq)
     return idg
 
-class AvalanchePhotodiode:
+class AvalanchePhotodiode(Frozen):
+    """
+        immutable APD model, variants with e.g. apd.replace(gain=50).
+        Can be the front end of a TIA, like a Photodiode: current(), dark_current(),
+        shot_noise_current() and dark_noise_current() include the gain M and excess noise F.
+        gain and temperature (default t_dark_current) may be arrays that broadcast.
+    """
+    __slots__ = ("k_", "effective_area_", "capacitance_", "leakage_", "dark_current_",
+                 "t_dark_current_", "dark_measurement_bw_", "gain_", "wavelength_", "temperature_")
     bandgap = 1.21 # eV silicon
 
-    def __init__(self, k, effective_area, capacitance, leakage, dark_current, t_dark_current, dark_measurement_bw, gain):
+    def __init__(self, k, effective_area, capacitance, leakage, dark_current, t_dark_current, dark_measurement_bw, gain,
+                 wavelength=850e-9, temperature=None):
         self.k_ = k
         self.effective_area_ = effective_area
         self.capacitance_ = capacitance
@@ -45,6 +110,8 @@ class AvalanchePhotodiode:
         self.t_dark_current_ = t_dark_current
         self.dark_measurement_bw_ = dark_measurement_bw
         self.gain_ = gain
+        self.wavelength_ = wavelength
+        self.temperature_ = temperature
 
     @property
     def capacitance(self):
@@ -62,16 +129,60 @@ class AvalanchePhotodiode:
     def gain(self):
         return self.gain_
 
-    def calculate_snr(self, il, bandwidth=1, t=None, R=1):
+    @property
+    def temperature(self):
+        """ operating temperature, K """
+        return self.t_dark_current_ if self.temperature_ is None else self.temperature_
+
+    @property
+    def responsivity(self):
+        """ unity-gain responsivity at the wavelength, A/W """
+        return self.eta*constants.elementary_charge*self.wavelength_/(constants.h*constants.c)
+
+    def current(self, P):
+        """ multiplied photocurrent (A) produced by input optical power P """
+        return self.gain*self.responsivity*P
+
+    def dark_current(self):
+        """ multiplied dark current (A) at the operating temperature """
+        return self.estimate_thermal_carrier_currents(t=self.temperature, bw=self.dark_measurement_bw_)
+
+    def shot_noise_current(self, P):
+        """ shot noise current density (A/sqrt(Hz)) of the photocurrent, sqrt(2 q M^2 F il) with il = responsivity P """
+        return numpy.sqrt(2*constants.elementary_charge*self.gain*self.F*self.current(P))
+
+    def dark_noise_current(self):
+        """ shot noise current density (A/sqrt(Hz)) of the dark current, sqrt(2 q M^2 F idg) with idg = dark_current()/M """
+        return numpy.sqrt(2*constants.elementary_charge*self.gain*self.F*self.dark_current())
+
+    def calculate_snr(self, il, bandwidth=1, t=None, R=1, M=None):
+        """
+            SNR at primary photocurrent il, see calculate_apd_snr(). M overrides the gain.
+            il, bandwidth, t, R and M broadcast against each other.
+        """
+        if t is None:
+            t = self.temperature
+        if M is None:
+            M = self.gain
+        dark_current = self.estimate_thermal_carrier_currents(t=t)
+        F = calc_excess_noise_factor(k=self.k_, M=M)
+        return calculate_apd_snr(il, t, M=M, B=bandwidth, F=F, R=R, dark_current=dark_current)
+
+    def optimal_gain(self, il, bandwidth=1, t=None, R=1, M_min=1.0, M_max=1e4):
+        """
+            SNR-maximizing gain at primary photocurrent il as an OptimalGain, see optimal_apd_gain().
+            Same noise model as calculate_snr(); il, bandwidth, t and R broadcast, e.g.
+            il[:, None] and t[None, :] give the optimal gain over an operating envelope.
+        """
         if t is None:
-            t = self.t_dark_current_
+            t = self.temperature
         dark_current = self.estimate_thermal_carrier_currents(t=t)
-        return calculate_apd_snr(il, t, M=self.gain, B=bandwidth, F=self.F, R=R, dark_current=dark_current)
+        return optimal_apd_gain(il, t, self.k_, bandwidth, R, dark_current, M_min, M_max)
 
     def estimate_thermal_carrier_currents(self, t=0, bw=1):
         return estimate_thermal_carrier_currents(t, bw, self.dark_measurement_bw_, self.dark_current_, self.t_dark_current_)
 
-    def calc_shot_noise_current(self, il, bandwidth, t=273):
+    def calc_shot_noise_current(self, il, bandwidth, t=273, M=None):
         '''
         APD shot noise for a given photocurrent il
         q: electron charge -> As
@@ -83,11 +194,12 @@ class AvalanchePhotodiode:
         k: ionization ratio (electrons/holes) -> unitless
         In: Apd shotnoise -> A
         B: bandwidth -> 1/s
+        il, bandwidth, t and M (default self.gain) broadcast against each other.
         '''
         B = bandwidth
-        sqrt = math.sqrt
+        sqrt = numpy.sqrt
         q = constants.elementary_charge
-        M = self.gain
+        M = self.gain if M is None else M
 
         dark_current = self.estimate_thermal_carrier_currents(t=t, bw=B) # no surface carrier contribution
         idg = dark_current/M
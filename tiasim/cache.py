@@ -0,0 +1,118 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import hashlib
+import numpy
+
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "entries", "nbytes", "max_entries", "max_bytes"])
+
+def array_key(a):
+    """
+        hashable key for the contents of an array
+        digest of the raw data plus dtype and shape, so equal grids share a key
+    """
+    a = numpy.ascontiguousarray(a)
+    return (a.dtype.str, a.shape, hashlib.blake2b(memoryview(a).cast("B"), digest_size=16).digest())
+
+_scalar_types = frozenset([float, int, complex, str, bool, type(None), numpy.float64])
+
+def value_key(value):
+    """
+        hashable key for a parameter value: arrays by content, dicts and lists as tuples,
+        objects with a key() method (model objects, tables) by their key
+    """
+    if type(value) in _scalar_types:
+        return value
+    if isinstance(value, numpy.ndarray):
+        return array_key(value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, value_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(value_key(v) for v in value)
+    if hasattr(value, "key"):
+        return value.key()
+    return value
+
+def object_key(obj):
+    """
+        hashable key for the current state of a model object (opamp, photodiode),
+        obj.key() for immutable model objects. Otherwise built from its type, identity
+        and attribute values, so in-place changes give a new key
+    """
+    if hasattr(obj, "key"):
+        return obj.key()
+    state = getattr(obj, "__dict__", {})
+    return (type(obj), id(obj), tuple((name, value_key(state[name])) for name in sorted(state)))
+
+class ResponseCache:
+    """
+        least-recently-used cache of frequency-response arrays
+
+        Entries are dicts of arrays keyed by an arbitrary hashable key.
+        Entries are evicted oldest-first when there are more than max_entries
+        or the stored arrays use more than max_bytes.
+    """
+    def __init__(self, max_entries=32, max_bytes=256*2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key):
+        """ cached entry for key, or None """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """ store entry (a dict of arrays) under key and evict down to the limits """
+        for value in entry.values():
+            if isinstance(value, numpy.ndarray):
+                value.setflags(write=False)
+        if key in self._entries:
+            self._nbytes -= _entry_nbytes(self._entries.pop(key))
+        self._entries[key] = entry
+        self._nbytes += _entry_nbytes(entry)
+        while self._entries and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self._nbytes -= _entry_nbytes(old)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, len(self._entries), self._nbytes, self.max_entries, self.max_bytes)
+
+def _entry_nbytes(entry):
+    return sum(numpy.asarray(v).nbytes for v in entry.values())
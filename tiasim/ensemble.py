@@ -0,0 +1,251 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+from scipy import constants
+
+from .tiasim import NoiseBreakdown, room_temperature, calc_feedback_transimpedance, calc_closed_loop_transimpedance
+from .tiasim import calc_step_response, step_time_grid
+from .risetime import step_metrics
+from .stability import calc_loop_gain, stability
+
+def bisect_log(residual, f_lo, f_hi, rtol=1e-6):
+    """
+    vectorized bisection in log-frequency
+    residual(f) maps an array of frequencies to an array of the same shape,
+    with residual(f_lo) and residual(f_hi) of opposite sign elementwise.
+    Returns the root frequencies to relative tolerance rtol.
+    """
+    x_lo = numpy.log10(f_lo)
+    x_hi = numpy.log10(f_hi)
+    r_lo = residual(f_lo)
+    width = numpy.max(x_hi - x_lo, initial=0.0)*numpy.log(10.0)
+    n_iter = int(numpy.ceil(numpy.log2(width/rtol))) if width > rtol else 0
+    for _ in range(n_iter):
+        x_mid = 0.5*(x_lo + x_hi)
+        r_mid = residual(10.0**x_mid)
+        same = numpy.sign(r_mid) == numpy.sign(r_lo)
+        x_lo = numpy.where(same, x_mid, x_lo)
+        r_lo = numpy.where(same, r_mid, r_lo)
+        x_hi = numpy.where(same, x_hi, x_mid)
+    return 10.0**(0.5*(x_lo + x_hi))
+
+class TIAEnsemble():
+    """
+        N designs sharing one opamp and photodiode type, with array-valued
+        R_F, C_F, C_F_parasitic and photodiode capacitance C_D.
+        gain_scale multiplies the opamp open-loop gain, and so its GBWP, per design.
+        For an AvalanchePhotodiode, M and T_D set its gain and temperature per design,
+        e.g. R_F[:, None] and M[None, :] co-optimize the APD bias and R_F in one sweep;
+        the optical power P is then a scalar.
+
+        The design parameters are broadcast against each other to self.shape.
+        Frequency-domain methods return arrays of shape self.shape + f.shape.
+        C_F=None, or nan elements of C_F, select the optimum C_F for each design as in TIA.optimal_CF().
+        Unlike TIA, C_F=0 is used as given.
+    """
+    def __init__(self, opamp, diode, R_F, C_F=None, C_F_parasitic=None, C_D=None, gain_scale=1.0, M=None, T_D=None):
+        self.opamp = opamp
+        self.diode = diode
+        if C_D is None:
+            C_D = diode.capacitance
+        if C_F_parasitic is None:
+            C_F_parasitic = 0.01e-12 # minimum capacitance over R_F
+        per_design = {name: x for name, x in (("gain", M), ("temperature", T_D)) if x is not None}
+        R_F, C_D, C_F_parasitic, gain_scale, *diode_parameters = numpy.broadcast_arrays(*(
+            numpy.asarray(x, dtype=float) for x in (R_F, C_D, C_F_parasitic, gain_scale, *per_design.values())))
+        if per_design:
+            self.diode = diode.replace(**dict(zip(per_design, diode_parameters)))
+        self._diode_per_design = bool(per_design)
+        self.R_F = R_F
+        self.gain_scale = gain_scale
+        self.C_D = C_D
+        self.C_F_parasitic = C_F_parasitic
+        self.C_tot = C_D + opamp.input_capacitance() # total source capacitance
+        if C_F is None:
+            C_F = numpy.nan
+        C_F = numpy.asarray(C_F, dtype=float)
+        self.C_F = numpy.where(numpy.isnan(C_F), self.optimal_CF(), C_F + C_F_parasitic)
+        self.R_F, self.C_F, self.C_tot, self.C_F_parasitic, self.gain_scale = numpy.broadcast_arrays(
+            self.R_F, self.C_F, self.C_tot, self.C_F_parasitic, self.gain_scale)
+
+    @property
+    def shape(self):
+        return self.R_F.shape
+
+    def __len__(self):
+        return self.R_F.size
+
+    def optimal_CF(self):
+        """
+            optimum C_F for each design, C_opt = sqrt( C_source / 2*pi*GBWP*R_F )
+            but not less than C_F_parasitic
+        """
+        C_optimal = numpy.sqrt( self.C_tot / (2.0*numpy.pi*self.GBWP*self.R_F))
+        return numpy.maximum(C_optimal, self.C_F_parasitic)
+
+    @property
+    def GBWP(self):
+        return self.gain_scale*self.opamp.GBWP
+
+    def _design(self, x, f):
+        """ design parameter x reshaped to broadcast against f, which gets trailing axes """
+        return x.reshape(x.shape + (1,)*numpy.ndim(f))
+
+    def _diode(self, x, f):
+        """ diode quantity x, per design when M or T_D were given, reshaped to broadcast against f """
+        if not self._diode_per_design:
+            return x
+        return self._design(numpy.broadcast_to(x, self.shape), f)
+
+    def response(self, f, per_design=False):
+        """
+            open-loop gain, ZF, ZM, closed loop voltage gain and opamp input noise as a dict,
+            see TIA.response(). With per_design=True f must broadcast against self.shape
+            and is evaluated elementwise, one frequency per design.
+        """
+        f = numpy.asarray(f, dtype=float)
+        if per_design:
+            R_F, C_F, C_tot, gain_scale = self.R_F, self.C_F, self.C_tot, self.gain_scale
+        else:
+            R_F, C_F, C_tot, gain_scale = (self._design(x, f) for x in (self.R_F, self.C_F, self.C_tot, self.gain_scale))
+        A = gain_scale*self.opamp.gain(f)
+        w = 2.0*numpy.pi*f
+        zf = calc_feedback_transimpedance(f, R_F, C_F)
+        zm = calc_closed_loop_transimpedance(f, gain_f=A, z_f=zf, c_tot=C_tot)
+        Avcl = A / (1.0+A/(1.0+1j*w*zf*C_tot))  # closed loop voltage gain
+        return {"gain": A, "ZF": zf, "ZM": zm, "Avcl": Avcl,
+                "voltage_noise": numpy.asarray(self.opamp.voltage_noise(f)),
+                "current_noise": numpy.asarray(self.opamp.current_noise(f))}
+
+    def ZF(self, f):
+        """ feedback impedance ZF = R_F || C_F, shape self.shape + f.shape """
+        f = numpy.asarray(f, dtype=float)
+        return calc_feedback_transimpedance(f, self._design(self.R_F, f), self._design(self.C_F, f))
+
+    def ZM(self, f):
+        """ closed loop transimpedance, shape self.shape + f.shape """
+        return self.response(f)["ZM"]
+
+    def amp_current_noise(self, f):
+        """ output-referred amplifier current noise, in V/sqrt(Hz) """
+        r = self.response(f)
+        return r["current_noise"]*numpy.abs(r["ZM"])
+
+    def amp_voltage_noise(self, f):
+        """ output referred amplifier voltage noise, in V/sqrt(Hz) """
+        r = self.response(f)
+        return r["voltage_noise"]*numpy.abs(r["Avcl"])
+
+    def johnson_noise(self, f, T=room_temperature):
+        """ output-referred voltage noise due to R_F, in V/sqrt(Hz) """
+        f = numpy.asarray(f, dtype=float)
+        return numpy.sqrt( 4*constants.k*T/self._design(self.R_F, f) ) * numpy.abs(self.ZM(f))
+
+    def shot_noise(self, P, f):
+        """ output-referred shot noise in V/sqrt(Hz) due to optical power P in W, with any APD excess noise """
+        f = numpy.asarray(f, dtype=float)
+        return self._diode(self.diode.shot_noise_current(P), f) * numpy.abs(self.ZM(f))
+
+    def diode_dark_noise(self, f):
+        """ output-referred shot noise of the diode dark current in V/sqrt(Hz) """
+        f = numpy.asarray(f, dtype=float)
+        return self._diode(self.diode.dark_noise_current(), f) * numpy.abs(self.ZM(f))
+
+    def dark_noise(self, f, T=room_temperature):
+        """ output referred TIA noise without photocurrent shot noise, in V/sqrt(Hz) """
+        return self.noise_breakdown(f, 0.0, T).dark
+
+    def bright_noise(self, P, f, T=room_temperature):
+        """ output referred TIA bright-noise with optical power P, in V/sqrt(Hz) """
+        return self.noise_breakdown(f, P, T).bright
+
+    def noise_breakdown(self, f, P=0.0, T=room_temperature):
+        """
+            all output-referred noise contributions as a NoiseBreakdown of arrays
+            with shape self.shape + f.shape, see TIA.noise_breakdown()
+        """
+        f = numpy.asarray(f, dtype=float)
+        r = self.response(f)
+        zm = numpy.abs(r["ZM"])
+        amp_current = r["current_noise"]*zm
+        amp_voltage = r["voltage_noise"]*numpy.abs(r["Avcl"])
+        johnson = numpy.sqrt( 4*constants.k*T/self._design(self.R_F, f) )*zm
+        diode_dark = self._diode(self.diode.dark_noise_current(), f)*zm
+        shot = self._diode(self.diode.shot_noise_current(P), f)*zm
+        dark = numpy.sqrt(amp_current**2 + amp_voltage**2 + johnson**2 + diode_dark**2)
+        bright = numpy.hypot(dark, shot)
+        return NoiseBreakdown(amp_current, amp_voltage, johnson, diode_dark, shot, dark, bright)
+
+    def dc_output(self, P, f):
+        """ output voltage amplitude at f of the photocurrent at optical power P plus the diode dark current """
+        f = numpy.asarray(f, dtype=float)
+        I_PD = self._diode(self.diode.current(P) + self.diode.dark_current(), f)
+        return I_PD*numpy.abs(self.ZM(f))
+
+    def bandwidth_approx(self):
+        """ Simple bandwidth approximation - usually not correct """
+        return numpy.sqrt( self.GBWP /(2*numpy.pi*self.R_F*self.C_tot))
+
+    def bandwidth(self, rtol=1e-6, f_min=1e1, f_max=1e10, n_grid=500):
+        """
+            The -3 dB bandwidth of every design, shape self.shape.
+            The first crossing of ZM(f_min)/sqrt(2) is bracketed on a coarse log grid
+            and refined by vectorized bisection. nan where it is not found below f_max.
+        """
+        f = numpy.logspace(numpy.log10(f_min), numpy.log10(f_max), int(n_grid))
+        zm = numpy.abs(self.ZM(f))
+        z_3db = zm[..., 0]/numpy.sqrt(2.0)
+        below = zm < z_3db[..., None]
+        found = below.any(axis=-1)
+        ind = numpy.where(found, below.argmax(axis=-1), 1)
+        f_3dB = bisect_log(lambda fx: numpy.abs(self.response(fx, per_design=True)["ZM"]) - z_3db,
+                           f[ind-1], f[ind], rtol)
+        return numpy.where(found, f_3dB, numpy.nan)
+
+    def loop_gain(self, f):
+        """ loop gain A beta of every design, shape self.shape + f.shape, see TIA.loop_gain() """
+        f = numpy.asarray(f, dtype=float)
+        r = self.response(f)
+        return calc_loop_gain(f, r["gain"], r["ZF"], self._design(self.C_tot, f))
+
+    def stability(self, rtol=1e-6, f_min=1e1, f_max=1e10):
+        """
+            crossover, phase margin, noise-gain peak and Q of every design as a Stability
+            of arrays with shape self.shape, all designs solved together.
+            See tiasim.stability.stability()
+        """
+        return stability(lambda f: self.response(f, per_design=True), self.C_tot, f_min, f_max, rtol)
+
+    def step_response(self, t):
+        """
+            output voltage per A of photocurrent step for every design,
+            shape self.shape + t.shape. See TIA.step_response()
+        """
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return calc_step_response(self.ZM, t)
+
+    def rise_time(self, t=None, settle=0.02):
+        """
+            10-90% rise time, overshoot and settling time of every design as a StepMetrics of arrays
+            with shape self.shape. All designs share one time grid, by default covering
+            the slowest design and resolving the fastest.
+        """
+        if t is None:
+            t = step_time_grid(self.bandwidth())
+        return step_metrics(t, self.step_response(t), settle=settle)
@@ -0,0 +1,189 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Fit opamp models to digitized datasheet curves.
+
+    Every part directory (e.g. examples/opa818) holds a curves.json manifest
+    naming its curve files and their units:
+
+    {"part": "OPA818", "poles": 2, "input_capacitance": 2.4e-12,
+     "gain": {"file": "opa818_AOL_gain.txt", "f_scale": 1e6, "db": true},
+     "phase": {"file": "opa818_AOL_phase.txt", "f_scale": 1e6},
+     "voltage_noise": {"file": "opa818_vn.txt", "f_scale": 1e6, "scale": 1e-9},
+     "current_noise": {"file": "opa818_in.txt", "f_scale": 1e6, "scale": 1e-15}}
+
+    A noise entry may instead give fixed model parameters {"a0": .., "a1": .., "n": ..}.
+    "phase" and "phase_weight" (default 1.0, see fit_gain()) are optional. Run as
+
+    python -m tiasim.fit examples/opa657 examples/opa818 ... -o parameters.json
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import numpy
+from scipy import optimize
+
+from .table import read_curve
+
+def pole_model(f, AOL_gain, poles):
+    """ open-loop gain AOL_gain / prod(1 + j f/p) """
+    f = numpy.asarray(f, dtype=float)
+    A = AOL_gain*numpy.ones(f.shape, dtype=complex)
+    for p in poles:
+        A /= 1.0 + 1j*f/p
+    return A
+
+def noise_model(f, a0, a1, n):
+    """ noise density a0 + a1/f^n, with n < 0 for noise rising with frequency """
+    return a0 + a1*numpy.power(f, -n)
+
+def fit_gain(f_gain, gain, f_phase=None, phase=None, n_poles=1, phase_weight=1.0):
+    """
+        least-squares fit of pole_model() to open-loop gain magnitude (V/V)
+        and, optionally, phase (degrees, negative for lag)
+
+        The residuals are ln|A| and phase in radians times phase_weight,
+        fitted in the parameters ln(AOL_gain), ln(pole) with analytic Jacobian.
+        Returns (AOL_gain, poles, rms_residual)
+    """
+    f_gain = numpy.asarray(f_gain, dtype=float)
+    log_gain = numpy.log(gain)
+    have_phase = f_phase is not None
+    if have_phase:
+        f_phase = numpy.asarray(f_phase, dtype=float)
+        phase = numpy.radians(phase)
+
+    A0 = numpy.max(gain)
+    GBWP = numpy.max(f_gain*gain)
+    x0 = numpy.log(numpy.concatenate([[A0, GBWP/A0],
+                                      numpy.geomspace(GBWP/10.0, 10*f_gain.max(), n_poles-1) if n_poles > 1 else []]))
+
+    def residual(x):
+        poles = numpy.exp(x[1:])
+        r = x[0] - 0.5*numpy.log1p((f_gain[:, None]/poles)**2).sum(axis=1) - log_gain
+        if not have_phase:
+            return r
+        r_phase = -numpy.arctan(f_phase[:, None]/poles).sum(axis=1) - phase
+        return numpy.concatenate([r, phase_weight*r_phase])
+
+    def jacobian(x):
+        poles = numpy.exp(x[1:])
+        u2 = (f_gain[:, None]/poles)**2
+        J = numpy.empty((len(f_gain), len(x)))
+        J[:, 0] = 1.0
+        J[:, 1:] = u2/(1.0 + u2)
+        if not have_phase:
+            return J
+        u = f_phase[:, None]/poles
+        J_phase = numpy.zeros((len(f_phase), len(x)))
+        J_phase[:, 1:] = phase_weight*u/(1.0 + u**2)
+        return numpy.concatenate([J, J_phase])
+
+    result = optimize.least_squares(residual, x0, jac=jacobian, method="lm")
+    x = result.x
+    return numpy.exp(x[0]), numpy.sort(numpy.exp(x[1:])), numpy.sqrt(numpy.mean(result.fun**2))
+
+def fit_noise(f, noise):
+    """
+        least-squares fit of noise_model() to a noise density curve,
+        in ln(noise) with parameters ln(a0), ln(a1), n and analytic Jacobian.
+        Returns (a0, a1, n, rms_residual)
+    """
+    f = numpy.asarray(f, dtype=float)
+    noise = numpy.asarray(noise, dtype=float)
+    log_noise = numpy.log(noise)
+    log_f = numpy.log(f)
+    rising = noise[-1] > noise[0]
+    n0 = -0.5 if rising else 0.5
+    a0 = 0.5*noise.min()
+    tail = -1 if rising else 0
+    a1 = max(noise[tail] - a0, a0)*f[tail]**n0
+    x0 = numpy.array([numpy.log(a0), numpy.log(a1), n0])
+
+    def parts(x):
+        t0 = numpy.exp(x[0])
+        t1 = numpy.exp(x[1] - x[2]*log_f)
+        return t0, t1, t0 + t1
+
+    def residual(x):
+        return numpy.log(parts(x)[2]) - log_noise
+
+    def jacobian(x):
+        t0, t1, m = parts(x)
+        return numpy.column_stack([t0/m, t1/m, -log_f*t1/m])
+
+    # keep the white floor a0 from vanishing (ln a0 -> -inf) on purely rising curves
+    lower = [numpy.log(noise.min()) - numpy.log(1e6), -numpy.inf, -4.0]
+    upper = [numpy.log(noise.max()), numpy.inf, 4.0]
+    result = optimize.least_squares(residual, x0, jac=jacobian, bounds=(lower, upper), method="trf")
+    x = result.x
+    return numpy.exp(x[0]), numpy.exp(x[1]), x[2], numpy.sqrt(numpy.mean(result.fun**2))
+
+def fit_part(directory, manifest="curves.json"):
+    """ fit the curves of one part directory, see the module docstring. Returns (part, parameters) """
+    with open(os.path.join(directory, manifest)) as f:
+        spec = json.load(f)
+
+    def curve(entry):
+        return read_curve(os.path.join(directory, entry["file"]), entry.get("f_scale", 1.0), entry.get("scale", 1.0))
+
+    f_gain, gain = curve(spec["gain"])
+    if spec["gain"].get("db", True):
+        gain = 10.0**(gain/20.0)
+    f_phase, phase = curve(spec["phase"]) if "phase" in spec else (None, None)
+    AOL_gain, poles, gain_rms = fit_gain(f_gain, gain, f_phase, phase, spec.get("poles", 1), spec.get("phase_weight", 1.0))
+    parameters = {"AOL_gain": float(AOL_gain), "poles": [float(p) for p in poles],
+                  "input_capacitance": spec["input_capacitance"], "rms_residual": {"gain": float(gain_rms)}}
+
+    for name in ("voltage_noise", "current_noise"):
+        entry = spec[name]
+        if "file" in entry:
+            a0, a1, n, rms = fit_noise(*curve(entry))
+            parameters["rms_residual"][name] = float(rms)
+        else:
+            a0, a1, n = entry["a0"], entry["a1"], entry["n"]
+        parameters[name] = {"a0": float(a0), "a1": float(a1), "n": float(n)}
+    return spec["part"], parameters
+
+def fit_parts(directories, workers=None):
+    """
+        fit_part() for every directory, in worker processes unless workers=1.
+        Returns a dict of part name to parameters, sorted by part name.
+    """
+    directories = list(directories)
+    if workers == 1:
+        fits = [fit_part(d) for d in directories]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            fits = list(pool.map(fit_part, directories))
+    return dict(sorted(fits))
+
+def write_parameters(path, parameters):
+    """ write fit_parts() output as JSON with stable key order and full float precision """
+    with open(path, "w") as f:
+        json.dump(parameters, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fit opamp models to datasheet curves")
+    parser.add_argument("directories", nargs="+", help="part directories holding curves.json")
+    parser.add_argument("-o", "--output", default="parameters.json")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    args = parser.parse_args()
+    write_parameters(args.output, fit_parts(args.directories, args.workers))
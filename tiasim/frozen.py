@@ -0,0 +1,114 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import abc
+
+from .cache import value_key
+
+class FrozenMeta(abc.ABCMeta):
+    """
+        metaclass of Frozen: freezes every instance once its whole __init__ chain has run,
+        so subclass constructors can assign attributes as usual
+    """
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if name not in fields and name not in cls._unkeyed:
+                    fields.append(name)
+        cls._fields = tuple(fields)
+
+    def __call__(cls, *args, **kwargs):
+        obj = cls.__new__(cls, *args, **kwargs)
+        object.__setattr__(obj, "_frozen", False)
+        object.__setattr__(obj, "_key", None)
+        obj.__init__(*args, **kwargs)
+        object.__setattr__(obj, "_frozen", True)
+        return obj
+
+class Frozen(metaclass=FrozenMeta):
+    """
+        immutable value type: attributes can only be set in __init__, equality and
+        hash are over the type and all parameters, see key().
+
+        Subclasses declare their attributes in __slots__. Slots listed in _unkeyed
+        (e.g. caches) are internal, excluded from key(), pickling and replace().
+        Subclasses without __slots__ still work, with their __dict__ entries as parameters.
+    """
+    __slots__ = ("_frozen", "_key")
+    _unkeyed = ("_frozen", "_key")
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError("%s is immutable, use replace(%s=...)" % (type(self).__name__, name.strip("_")))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def _parameters(self):
+        """ (name, value) of every parameter, slots first and then any __dict__ entries """
+        items = [(name, getattr(self, name, None)) for name in self._fields]
+        items.extend(sorted(getattr(self, "__dict__", {}).items()))
+        return items
+
+    def key(self):
+        """ hashable key of the type and all parameter values, computed once """
+        key = self._key
+        if key is None:
+            key = (type(self),) + tuple((name, value_key(value)) for name, value in self._parameters())
+            object.__setattr__(self, "_key", key)
+        return key
+
+    def __eq__(self, other):
+        if not isinstance(other, Frozen):
+            return NotImplemented
+        return self is other or self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __getstate__(self):
+        return dict(self._parameters())
+
+    def __setstate__(self, state):
+        object.__setattr__(self, "_key", None)
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_frozen", True)
+
+    def replace(self, **changes):
+        """
+            copy with the given parameters changed, e.g. diode.replace(capacitance=1.6e-12).
+            A parameter stored as _name or name_ can be given as name.
+        """
+        state = self.__getstate__()
+        for name, value in changes.items():
+            for stored in (name, "_" + name, name + "_"):
+                if stored in state:
+                    state[stored] = value
+                    break
+            else:
+                raise TypeError("%s has no parameter %s" % (type(self).__name__, name))
+        obj = object.__new__(type(self))
+        obj.__setstate__(state)
+        return obj
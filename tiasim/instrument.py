@@ -0,0 +1,229 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Opt-in instrumentation of the model methods.
+
+        with tiasim.instrument.profiling() as profile:
+            tia.bandwidth()
+        print(profile.table())
+        profile.write_chrome_trace("trace.json")    # chrome://tracing or https://ui.perfetto.dev
+        profile.write_pstats("model.prof")          # pstats.Stats("model.prof"), snakeviz, ...
+
+    While profiling, the methods of TIA, TIAEnsemble, every Opamp, Photodiode and
+    AvalanchePhotodiode class and find_bandwidth() are replaced by wrappers that count calls, time
+    them and add up the sizes of their array arguments. The originals are put
+    back afterwards, so there is no cost when profiling is off. Classes defined
+    after profiling started and work in worker processes are not recorded.
+
+    Setting the environment variable TIASIM_PROFILE when tiasim is imported
+    profiles the whole run: TIASIM_PROFILE=1 prints the table to stderr at exit,
+    TIASIM_PROFILE=path.json writes a Chrome trace and any other path a pstats file.
+"""
+
+import atexit
+import collections
+import functools
+import inspect
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+import numpy
+
+_active = None
+
+Record = collections.namedtuple("Record", ["name", "calls", "total", "own", "points"])
+Record.__doc__ = """
+    statistics of one instrumented method, see Profile.records()
+    name: e.g. "TIA.ZM"
+    calls: number of calls
+    total, own: time in s including and excluding instrumented callees
+    points: sum over calls of the largest array argument's size
+"""
+
+class Profile:
+    """
+        call statistics collected by profiling()
+        trace: keep every call as a Chrome trace event, up to max_events
+    """
+    def __init__(self, trace=True, max_events=10**6):
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+        self._stats = {}        # name: [calls, total ns, own ns, points]
+        self._callers = {}      # (caller, name): [calls, total ns, own ns]
+        self._functions = {}    # name: (file, line)
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name, caller, start, elapsed, child, points):
+        own = elapsed - child
+        s = self._stats.get(name)
+        if s is None:
+            s = self._stats[name] = [0, 0, 0, 0]
+        s[0] += 1
+        s[1] += elapsed
+        s[2] += own
+        s[3] += points
+        c = self._callers.get((caller, name))
+        if c is None:
+            c = self._callers[(caller, name)] = [0, 0, 0]
+        c[0] += 1
+        c[1] += elapsed
+        c[2] += own
+        if self.trace and len(self.events) < self.max_events:
+            self.events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                                "ts": (start - self._origin)/1e3, "dur": elapsed/1e3, "args": {"points": points}})
+
+    def records(self):
+        """ a Record per instrumented method that was called, by decreasing total time """
+        r = [Record(name, s[0], s[1]*1e-9, s[2]*1e-9, s[3]) for name, s in self._stats.items()]
+        return sorted(r, key=lambda x: -x.total)
+
+    def table(self, limit=None):
+        """ the records as a text table """
+        lines = ["%-40s %8s %11s %11s %11s %12s" % ("method", "calls", "total ms", "own ms", "mean us", "points")]
+        for r in self.records()[:limit]:
+            lines.append("%-40s %8d %11.3f %11.3f %11.2f %12d" % (r.name, r.calls, r.total*1e3, r.own*1e3,
+                                                                  r.total/r.calls*1e6, r.points))
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        """ the recorded calls as Chrome trace event JSON """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def write_pstats(self, path):
+        """ the statistics in the marshal format of cProfile, readable by pstats.Stats(path) """
+        def key(name):
+            filename, line = self._functions.get(name, ("~", 0))
+            return (filename, line, name)
+        stats = {}
+        for name, s in self._stats.items():
+            callers = {}
+            for (caller, callee), c in self._callers.items():
+                if callee == name and caller is not None:
+                    callers[key(caller)] = (c[0], c[0], c[2]*1e-9, c[1]*1e-9)
+            stats[key(name)] = (s[0], s[0], s[2]*1e-9, s[1]*1e-9, callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+def _points(args, kwargs):
+    n = 0
+    for a in args:
+        if type(a) is numpy.ndarray and a.size > n:
+            n = a.size
+    for a in kwargs.values():
+        if type(a) is numpy.ndarray and a.size > n:
+            n = a.size
+    return n
+
+def _wrap(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = _active
+        if profile is None:
+            return function(*args, **kwargs)
+        stack = profile._stack()
+        caller = stack[-1][0] if stack else None
+        frame = [name, 0]           # name, time spent in instrumented callees
+        stack.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            profile._record(name, caller, start, elapsed, frame[1], _points(args, kwargs))
+    return wrapper
+
+def _subclasses(cls):
+    yield cls
+    for sub in cls.__subclasses__():
+        yield from _subclasses(sub)
+
+def _targets():
+    """ (owner, attribute name, display name) of everything to instrument """
+    from . import tiasim, ensemble, avalanche_photodiode
+    classes = [tiasim.TIA, ensemble.TIAEnsemble]
+    classes += list(_subclasses(tiasim.Opamp)) + list(_subclasses(tiasim.Photodiode))
+    classes += list(_subclasses(avalanche_photodiode.AvalanchePhotodiode))
+    for cls in dict.fromkeys(classes):
+        for attr, value in list(vars(cls).items()):
+            if inspect.isfunction(value) and (not attr.startswith("__") or attr == "__init__"):
+                yield cls, attr, "%s.%s" % (cls.__name__, attr)
+    yield tiasim, "find_bandwidth", "find_bandwidth"
+
+class profiling:
+    """
+        context manager that instruments the model methods and yields the Profile,
+        see the module docstring. Profiles do not nest.
+    """
+    def __init__(self, trace=True, max_events=10**6):
+        self.profile = Profile(trace, max_events)
+        self._patched = []
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("profiling is already active")
+        for owner, attr, name in _targets():
+            original = getattr(owner, attr) if not inspect.isclass(owner) else vars(owner)[attr]
+            code = getattr(original, "__code__", None)
+            if code is not None:
+                self.profile._functions[name] = (code.co_filename, code.co_firstlineno)
+            setattr(owner, attr, _wrap(original, name))
+            self._patched.append((owner, attr, original))
+        _active = self.profile
+        return self.profile
+
+    def __exit__(self, *exc):
+        global _active
+        _active = None
+        for owner, attr, original in reversed(self._patched):
+            setattr(owner, attr, original)
+        self._patched = []
+        return False
+
+def enable_from_environment(variable="TIASIM_PROFILE"):
+    """ start profiling for the rest of the process if the environment variable is set, see the module docstring """
+    target = os.environ.get(variable)
+    if not target or _active is not None:
+        return None
+    context = profiling(trace=target.endswith(".json"))
+    profile = context.__enter__()
+
+    def report():
+        context.__exit__(None, None, None)
+        if target.endswith(".json"):
+            profile.write_chrome_trace(target)
+        elif target.lower() in ("1", "true", "yes", "on"):
+            print(profile.table(), file=sys.stderr)
+        else:
+            profile.write_pstats(target)
+    atexit.register(report)
+    return profile
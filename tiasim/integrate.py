@@ -0,0 +1,91 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import numpy
+
+LogIntegral = collections.namedtuple("LogIntegral", ["value", "error", "f", "cumulative", "n_eval"])
+LogIntegral.__doc__ = """
+    result of integrate_log()
+    value: integral of each row of the integrand, shape (k,)
+    error: estimated absolute error of each row, shape (k,)
+    f: frequencies of the refined grid, increasing from f_lo to f_hi
+    cumulative: running integral of each row from f_lo up to f, shape (k, len(f))
+    n_eval: number of frequencies the integrand was evaluated at
+"""
+
+def integrate_log(func, f_lo, f_hi, rtol=1e-4, n_init=16, max_iter=40):
+    """
+    integrate the rows of func(f) from f_lo to f_hi with adaptive Simpson's rule in log(f)
+
+    func maps a 1-D array of n frequencies to an array of shape (k, n).
+    The integral is taken in x = ln(f) with integrand func(f)*f. Intervals are
+    split independently until the Simpson/half-interval Simpson difference of every
+    row is below rtol times that row's integral, shared out in proportion to the
+    interval width. All intervals of one refinement level are evaluated in one call.
+    """
+    def g(x):
+        f = numpy.exp(x)
+        return numpy.atleast_2d(func(f))*f
+
+    x_lo, x_hi = numpy.log(f_lo), numpy.log(f_hi)
+    width = x_hi - x_lo
+    nodes = numpy.linspace(x_lo, x_hi, 2*n_init+1)
+    y = g(nodes)
+    a, b = nodes[:-2:2], nodes[2::2]
+    ya, ym, yb = y[:, :-2:2], y[:, 1:-1:2], y[:, 2::2]
+    s = (b - a)/6.0*(ya + 4*ym + yb)
+    n_eval = len(nodes)
+
+    done_a, done_b, done_s, done_err = [], [], [], []
+    for it in range(max_iter):
+        m = 0.5*(a + b)
+        xl, xr = 0.5*(a + m), 0.5*(m + b)
+        y2 = g(numpy.concatenate([xl, xr]))
+        n_eval += y2.shape[1]
+        yl, yr = y2[:, :len(a)], y2[:, len(a):]
+        s_left = (m - a)/6.0*(ya + 4*yl + ym)
+        s_right = (b - m)/6.0*(ym + 4*yr + yb)
+        s2 = s_left + s_right
+        err = numpy.abs(s2 - s)/15.0
+
+        total = numpy.abs(s2.sum(axis=1) + sum(d.sum(axis=1) for d in done_s))
+        tol = rtol*total[:, None]*(b - a)/width
+        ok = numpy.all(err <= tol, axis=0) | (it == max_iter - 1)
+        done_a.append(a[ok])
+        done_b.append(b[ok])
+        done_s.append(s2[:, ok] + (s2[:, ok] - s[:, ok])/15.0)
+        done_err.append(err[:, ok])
+
+        split = ~ok
+        if not split.any():
+            break
+        a = numpy.concatenate([a[split], m[split]])
+        b = numpy.concatenate([m[split], b[split]])
+        ya, ym, yb = (numpy.concatenate(p, axis=1) for p in ((ya[:, split], ym[:, split]),
+                                                            (yl[:, split], yr[:, split]),
+                                                            (ym[:, split], yb[:, split])))
+        s = numpy.concatenate([s_left[:, split], s_right[:, split]], axis=1)
+
+    a = numpy.concatenate(done_a)
+    order = numpy.argsort(a)
+    pieces = numpy.concatenate(done_s, axis=1)[:, order]
+    cumulative = numpy.concatenate([numpy.zeros((pieces.shape[0], 1)), numpy.cumsum(pieces, axis=1)], axis=1)
+    f = numpy.exp(numpy.concatenate([a[order][:1], numpy.concatenate(done_b)[order]]))
+    error = numpy.concatenate(done_err, axis=1).sum(axis=1)
+    return LogIntegral(cumulative[:, -1], error, f, cumulative, n_eval)
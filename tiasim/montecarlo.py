@@ -0,0 +1,123 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+from .ensemble import TIAEnsemble
+from .sweep import run_chunks, trapezoid
+
+monte_carlo_dtype = numpy.dtype([
+    ("R_F", "f8"),
+    ("C_F", "f8"),              # feedback capacitor, without C_F_parasitic
+    ("C_D", "f8"),              # photodiode capacitance
+    ("C_F_parasitic", "f8"),
+    ("gain_scale", "f8"),       # opamp open-loop gain (GBWP) relative to nominal
+    ("bandwidth", "f8"),        # -3 dB bandwidth, Hz
+    ("peaking", "f8"),          # max |ZM| relative to |ZM(f[0])|, dB
+    ("noise_rms", "f8"),        # dark output noise integrated over f, V rms
+])
+
+# order in which component values are drawn, fixed for reproducibility
+components = ("R_F", "C_F", "C_D", "C_F_parasitic", "GBWP")
+
+def uniform(tolerance):
+    """ multiplicative factors uniformly distributed within +-tolerance, e.g. 0.1 for +-10% """
+    return lambda rng, n: rng.uniform(1.0 - tolerance, 1.0 + tolerance, n)
+
+def normal(sigma):
+    """ normally distributed multiplicative factors with relative standard deviation sigma """
+    return lambda rng, n: rng.normal(1.0, sigma, n)
+
+def lognormal(sigma):
+    """ log-normally distributed multiplicative factors, sigma of the natural log """
+    return lambda rng, n: rng.lognormal(0.0, sigma, n)
+
+class MonteCarloResult:
+    """
+        Monte Carlo samples as a structured array (monte_carlo_dtype) with summary statistics
+    """
+    metrics = ("bandwidth", "peaking", "noise_rms")
+
+    def __init__(self, samples, seed=None):
+        self.samples = samples
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentiles(self, q=(1, 5, 50, 95, 99)):
+        """ dict of metric name to its percentiles q, ignoring designs where it is nan """
+        return {name: numpy.nanpercentile(self.samples[name], q) for name in self.metrics}
+
+    def limits(self, q=(0.5, 99.5)):
+        """ dict of metric name to a (low, high) acceptance range from percentiles q """
+        return {name: tuple(p) for name, p in self.percentiles(q).items()}
+
+    def histogram(self, name, bins=50):
+        """ numpy.histogram of the finite values of a sample column """
+        x = self.samples[name]
+        return numpy.histogram(x[numpy.isfinite(x)], bins=bins)
+
+def monte_carlo(tia, tolerances, n=100000, seed=None, f=None, workers=1, chunk_size=2000, callback=None):
+    """
+        tolerance analysis of the design tia, a TIA
+
+        tolerances: dict of component name ("R_F", "C_F", "C_D", "C_F_parasitic", "GBWP")
+                    to a distribution, a callable (rng, n) -> n multiplicative factors
+                    such as uniform(0.1) or normal(0.05). Other components stay nominal.
+        seed: seed for numpy.random.default_rng; the draws do not depend on workers or chunk_size
+        f: frequency grid for peaking and integrated noise, default logspace(1, 10, 300)
+        workers, chunk_size, callback: see tiasim.sweep.run_chunks()
+
+        Every sample is evaluated with the vectorized TIAEnsemble model.
+        Returns a MonteCarloResult.
+    """
+    unknown = set(tolerances) - set(components)
+    if unknown:
+        raise ValueError("unknown components %s" % sorted(unknown))
+    rng = numpy.random.default_rng(seed)
+    factors = {name: tolerances[name](rng, n) if name in tolerances else numpy.ones(n) for name in components}
+
+    samples = numpy.empty(n, dtype=monte_carlo_dtype)
+    samples["R_F"] = tia.R_F*factors["R_F"]
+    samples["C_F"] = (tia.C_F - tia.C_F_parasitic)*factors["C_F"]
+    samples["C_D"] = (tia.C_tot - tia.opamp.input_capacitance())*factors["C_D"]
+    samples["C_F_parasitic"] = tia.C_F_parasitic*factors["C_F_parasitic"]
+    samples["gain_scale"] = factors["GBWP"]
+
+    if f is None:
+        f = numpy.logspace(1, 10, 300)
+    context = (tia.opamp, tia.diode, samples, numpy.asarray(f, dtype=float))
+    run_chunks(_evaluate_chunk, context, samples, chunk_size, workers, callback, split=_split_chunk)
+    return MonteCarloResult(samples, seed)
+
+def _split_chunk(context, start, stop):
+    """ the context with only the samples of one chunk """
+    opamp, diode, samples, f = context
+    return opamp, diode, samples[start:stop], f
+
+def _evaluate_chunk(context, start, stop):
+    opamp, diode, samples, f = context
+    out = samples.copy()
+    tia = TIAEnsemble(opamp, diode, out["R_F"], out["C_F"], out["C_F_parasitic"],
+                      C_D=out["C_D"], gain_scale=out["gain_scale"])
+    zm = numpy.abs(tia.ZM(f))
+    out["bandwidth"] = tia.bandwidth()
+    out["peaking"] = 20.0*numpy.log10(zm.max(axis=-1)/zm[:, 0])
+    out["noise_rms"] = numpy.sqrt(trapezoid(tia.dark_noise(f)**2, f, axis=-1))
+    return out
@@ -1,30 +1,166 @@
+import json
+import os
 import numpy
 from tiasim import Opamp
+from tiasim.table import LogTable, read_curve
 
 class SinglePoleOpAmp(Opamp):
+    __slots__ = ()
+
+    @property
+    def poles(self):
+        return (self.AOL_bw,)
+
     def gain(self, f):
         """ gain """
         return  self.AOL_gain / (1.0+ 1j * f/self.AOL_bw )
 
 
 class TwoPoleAmplifier(Opamp):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    __slots__ = ("_AOL_pole",)
 
-        try:
-            self._AOL_pole = kwargs.pop("AOL_pole")
-        except KeyError:
-            self._AOL_pole = args[-1]
+    def __init__(self, AOL_gain, AOL_bw, GBWP, AOL_pole):
+        super().__init__(AOL_gain, AOL_bw, GBWP)
+        self._AOL_pole = AOL_pole
 
     @property
     def AOL_pole(self):
         return self._AOL_pole
 
+    @property
+    def poles(self):
+        return (self.AOL_bw, self.AOL_pole)
+
     def gain(self, f):
         """ gain """
         return  self.AOL_gain / (1.0+ 1j * f/self.AOL_bw ) * (1.0/ (1.0+ 1j * f/self.AOL_pole ) )
 
+class TabulatedOpamp(Opamp):
+    """
+        opamp defined by datasheet curves instead of a pole model
+
+        gain: (f, |AOL|) open-loop gain magnitude in V/V
+        phase: (f, phase) open-loop phase in degrees, negative for lag
+        voltage_noise, current_noise: (f, noise) in V/sqrt(Hz) and A/sqrt(Hz)
+        GBWP: defaults to the largest |AOL|*f in the gain table
+
+        Curves are interpolated linearly in log-log (phase: linear in log f).
+        Gain and phase are held constant outside their tables, except the gain
+        magnitude which keeps its last slope above the highest frequency.
+        Noise curves keep their end slopes on both sides.
+    """
+    __slots__ = ("_gain", "_voltage_noise", "_current_noise", "_input_capacitance")
+
+    def __init__(self, gain, phase, voltage_noise, current_noise, input_capacitance, GBWP=None):
+        magnitude = LogTable(*gain, extrapolate=(False, True))
+        phase = LogTable(phase[0], numpy.radians(phase[1]), log_y=False)
+        # both curves are piecewise linear in log f on the union of their
+        # frequencies, so one complex table on that grid reproduces them exactly
+        f = numpy.union1d(magnitude.x, phase.x)
+        self._gain = LogTable(f, magnitude(f)*numpy.exp(1j*phase(f)), extrapolate=(False, True))
+        self._voltage_noise = LogTable(*voltage_noise, extrapolate=(True, True))
+        self._current_noise = LogTable(*current_noise, extrapolate=(True, True))
+        self._input_capacitance = input_capacitance
+        AOL_gain = magnitude.y[0]
+        if GBWP is None:
+            GBWP = numpy.max(magnitude.x*magnitude.y)
+        super().__init__(AOL_gain, GBWP/AOL_gain, GBWP)
+
+    @classmethod
+    def from_files(cls, gain, phase, voltage_noise, current_noise, input_capacitance,
+                   f_scale=1.0, noise_scale=(1e-9, 1e-15), gain_db=True, GBWP=None):
+        """
+            TabulatedOpamp from digitized curve files, see tiasim.table.read_curve()
+
+            f_scale: frequency unit of the files in Hz, one value or one per file
+                     (gain, phase, voltage_noise, current_noise), e.g. 1e6 for MHz
+            noise_scale: units of the voltage and current noise files, default nV and fA
+            gain_db: gain file in dB rather than V/V
+        """
+        f_scale = numpy.broadcast_to(f_scale, (4,))
+        f_g, g = read_curve(gain, f_scale[0])
+        if gain_db:
+            g = 10.0**(g/20.0)
+        return cls((f_g, g),
+                   read_curve(phase, f_scale[1]),
+                   read_curve(voltage_noise, f_scale[2], noise_scale[0]),
+                   read_curve(current_noise, f_scale[3], noise_scale[1]),
+                   input_capacitance, GBWP)
+
+    def gain(self, f):
+        """ complex open-loop gain """
+        return self._gain(f)
+
+    def voltage_noise(self, f):
+        """ amplifier input voltage noise in V/sqrt(Hz) """
+        return self._voltage_noise(f)
+
+    def current_noise(self, f):
+        """ amplifier input current noise in A/sqrt(Hz) """
+        return self._current_noise(f)
+
+    def input_capacitance(self):
+        return self._input_capacitance
+
+class PoleOpamp(Opamp):
+    """
+        opamp with open-loop gain AOL_gain / prod(1 + j f/p) over its poles
+        and noise densities a0 + a1/f^n, e.g. as fitted by tiasim.fit
+
+        voltage_noise, current_noise: dicts with keys a0, a1, n
+        GBWP: defaults to AOL_gain times the lowest pole
+
+        Only from_parameters() reads the fitted values in parameters.json. The named
+        classes OPA855, OPA858, OPA859, OPA657, OPA818 and OPA847 keep their
+        hand-tuned constants, so results computed with them do not change when parts are refitted.
+    """
+    __slots__ = ("_poles", "_voltage_noise", "_current_noise", "_input_capacitance")
+
+    parameter_file = os.path.join(os.path.dirname(__file__), "parameters.json")
+
+    def __init__(self, AOL_gain, poles, voltage_noise, current_noise, input_capacitance, GBWP=None):
+        self._poles = tuple(sorted(poles))
+        self._voltage_noise = dict(voltage_noise)
+        self._current_noise = dict(current_noise)
+        self._input_capacitance = input_capacitance
+        if GBWP is None:
+            GBWP = AOL_gain*self._poles[0]
+        super().__init__(AOL_gain, self._poles[0], GBWP)
+
+    @classmethod
+    def from_parameters(cls, part, path=None):
+        """ the fitted model of part (e.g. "OPA818") from a tiasim.fit parameter file, by default parameters.json in this package """
+        with open(path or cls.parameter_file) as f:
+            p = json.load(f)[part]
+        return cls(p["AOL_gain"], p["poles"], p["voltage_noise"], p["current_noise"], p["input_capacitance"])
+
+    @property
+    def poles(self):
+        return self._poles
+
+    def gain(self, f):
+        """ gain """
+        A = self.AOL_gain
+        for p in self._poles:
+            A = A / (1.0 + 1j*f/p)
+        return A
+
+    def voltage_noise(self, f):
+        """ amplifier input voltage noise in V/sqrt(Hz) """
+        p = self._voltage_noise
+        return p["a0"] + p["a1"]*numpy.power(f, -p["n"])
+
+    def current_noise(self, f):
+        """ amplifier input current noise in A/sqrt(Hz) """
+        p = self._current_noise
+        return p["a0"] + p["a1"]*numpy.power(f, -p["n"])
+
+    def input_capacitance(self):
+        return self._input_capacitance
+
 class IdealOpamp(SinglePoleOpAmp):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -46,6 +182,8 @@ class OPA855(SinglePoleOpAmp):
          8-GHz Gain Bandwidth Product, Gain of 7-V/V Stable, Bipolar Input Amplifier
          https://www.ti.com/lit/ds/symlink/opa855.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain = 10093.79531159
         AOL_bw = 941445.81175752
@@ -77,6 +215,8 @@ class OPA858(SinglePoleOpAmp):
         5.5 GHz Gain Bandwidth Product, Decompensated Transimpedance Amplifier with FET Input
         https://www.ti.com/lit/ds/symlink/opa858.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain =  6645.80643846   # pow(10,66.0/20.0)
         AOL_bw = 1091348.67318369
@@ -110,6 +250,8 @@ class OPA859(SinglePoleOpAmp):
         1.8 GHz Unity-Gain Bandwidth, 3.3-nV/sqrt(Hz), FET Input Amplifier
         https://www.ti.com/product/OPA859
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain = 2152.02871113
         AOL_bw = 519231.04490493
@@ -144,6 +286,8 @@ class OPA657(TwoPoleAmplifier):
         1.3 fA/sqrt(Hz) current noise
         Gain of +7 stable
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain = pow(10,75.0/20.0)
         AOL_bw = 10*45626.55598007
@@ -173,6 +317,8 @@ class OPA818(TwoPoleAmplifier):
         https://www.ti.com/lit/ds/symlink/opa818.pdf
         Gain of +7 stable
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain = pow(10,94.3/20.0)
         AOL_bw = 50e3
@@ -202,6 +348,8 @@ class OPA847(SinglePoleOpAmp):
         stable for gains >=12
         https://www.ti.com/lit/ds/symlink/opa847.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         AOL_gain = 57666.09586591
         AOL_bw = 65178.06837912
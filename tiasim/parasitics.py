@@ -0,0 +1,153 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import numpy
+from scipy import constants, optimize
+
+from .tiasim import room_temperature
+
+parameters = ("C_F_parasitic", "C_tot", "gain_scale", "f_load")
+
+ParasiticFit = collections.namedtuple("ParasiticFit", list(parameters) + ["rms", "dbm", "nfev", "success"])
+ParasiticFit.__doc__ = """
+    result of fit_parasitics()
+    C_F_parasitic, C_tot: fitted capacitances in F
+    gain_scale: opamp open-loop gain (GBWP) relative to the opamp model
+    f_load: output-load pole in Hz, inf when not fitted
+    rms: rms residual in dB over the fitted points
+    dbm: fitted model spectrum, same shape as the data
+    nfev: number of model evaluations
+"""
+
+_db = 10.0/numpy.log(10.0)
+
+class SpectrumModel:
+    """
+        output noise spectrum of a TIA in dBm as a spectrum analyzer shows it,
+        v_to_dbm(bright_noise(P, f), RBW) times an output-load pole 1/(1 + j f/f_load),
+        as a function of the parameters C_F_parasitic, C_tot, gain_scale and f_load.
+
+        Opamp gain and noise at f come from tia.response(f), once; each evaluation
+        only recomputes the feedback network. dbm_and_jacobian() returns the
+        analytic derivatives with respect to the log of each parameter.
+    """
+    def __init__(self, tia, f, RBW, P=0.0, T=room_temperature, termination=True):
+        self.f = numpy.asarray(f, dtype=float)
+        r = tia.response(self.f)
+        self.A0 = r["gain"]
+        self.e2 = numpy.square(numpy.abs(r["voltage_noise"]))
+        P = numpy.atleast_1d(numpy.asarray(P, dtype=float))
+        # current noise densities into ZM: opamp, R_F Johnson, diode dark and shot noise, shape (len(P), len(f))
+        self.i2 = (numpy.square(r["current_noise"]) + 4*constants.k*T/tia.R_F
+                   + numpy.square(tia.diode.shot_noise_current(P))[:, None]
+                   + numpy.square(tia.diode.dark_noise_current()))
+        self.R_F = tia.R_F
+        self.C_F = tia.C_F - tia.C_F_parasitic
+        self.offset = 10.0*numpy.log10(RBW/50.0/1e-3) - (6.0 if termination else 0.0)
+
+    def dbm_and_jacobian(self, C_F_parasitic, C_tot, gain_scale, f_load):
+        """ model in dBm, shape (len(P), len(f)), and its derivatives d dBm/d ln(parameter) stacked on a last axis """
+        u = 2j*numpy.pi*self.f
+        A = gain_scale*self.A0
+        zf = self.R_F/(1.0 + u*self.R_F*(self.C_F + C_F_parasitic))
+        N = 1.0 + u*zf*C_tot
+        D = N + A
+        D2 = D*D
+        zm = A*zf/D
+        av = A*N/D
+
+        # d/dZF, d/dC_tot and d/dA of ZM and Avcl, with dZF/dC_F = -u ZF^2
+        dzf = -u*zf*zf*C_F_parasitic
+        d_zm = numpy.stack([A*(1.0 + A)/D2*dzf, -A*u*zf*zf/D2*C_tot, A*zf*N/D2])
+        d_av = numpy.stack([A*A/D2*u*C_tot*dzf, A*A/D2*u*zf*C_tot, A*N*N/D2])
+
+        zm2 = numpy.square(numpy.abs(zm))
+        av2 = numpy.square(numpy.abs(av))
+        S = self.i2*zm2 + self.e2*av2
+        dS = (self.i2[..., None]*2.0*numpy.real(numpy.conj(zm)*d_zm).T
+              + (self.e2*2.0*numpy.real(numpy.conj(av)*d_av)).T)
+        x2 = numpy.square(self.f/f_load)
+        load = -_db*numpy.log1p(x2)
+        dbm = _db*numpy.log(S) + load + self.offset
+        jac = numpy.empty(dbm.shape + (4,))
+        jac[..., :3] = _db*dS/S[..., None]
+        jac[..., 3] = 2.0*_db*x2/(1.0 + x2)
+        return dbm, jac
+
+def fit_parasitics(tia, f, dbm, RBW, P=0.0, T=room_temperature, fit=parameters, mask=None,
+                   f_load=numpy.inf, gain_scale=1.0, termination=True):
+    """
+        fit C_F_parasitic, C_tot, gain_scale and f_load of tia to measured noise spectra
+
+        f: frequencies in Hz; dbm: measured spectrum in dBm at resolution bandwidth RBW,
+           shape (len(f),), or (len(P), len(f)) for several optical powers P fitted jointly
+        fit: names of the parameters to fit, the others keep their starting values
+        mask: boolean array selecting the points to fit, e.g. above the analyzer floor.
+              Points at f <= 0 are always excluded.
+        f_load, gain_scale: starting values; C_F_parasitic and C_tot start from tia
+
+        Least squares in the log of the parameters, with analytic Jacobian.
+    """
+    f = numpy.asarray(f, dtype=float)
+    dbm = numpy.asarray(dbm, dtype=float)
+    use = f > 0
+    if mask is not None:
+        use &= numpy.asarray(mask, dtype=bool)
+    model = SpectrumModel(tia, f[use], RBW, P, T, termination)
+    data = numpy.atleast_2d(dbm)[:, use]
+
+    start = numpy.array([tia.C_F_parasitic or 0.01e-12, tia.C_tot, gain_scale,
+                         f_load if numpy.isfinite(f_load) else 1e3*f.max()])
+    free = numpy.array([name in fit for name in parameters])
+    if not numpy.all(numpy.isin(fit, parameters)):
+        raise ValueError("unknown parameters %s" % sorted(set(fit) - set(parameters)))
+    x_start = numpy.log(start)
+    lower = x_start - numpy.log([1e3, 1e3, 1e2, 1e3])
+    upper = x_start + numpy.log([1e3, 1e3, 1e2, 1e3])
+    lower[3] = numpy.log(f[use].min())
+    last = {}
+
+    def evaluate(x_free):
+        x = x_start.copy()
+        x[free] = x_free
+        if last.get("x") is None or not numpy.array_equal(last["x"], x):
+            p = numpy.exp(x)
+            if "f_load" not in fit and not numpy.isfinite(f_load):
+                p[3] = numpy.inf
+            last["x"] = x
+            last["value"] = model.dbm_and_jacobian(*p)
+        return last["value"]
+
+    def residual(x_free):
+        return (evaluate(x_free)[0] - data).ravel()
+
+    def jacobian(x_free):
+        return evaluate(x_free)[1][..., free].reshape(-1, free.sum())
+
+    result = optimize.least_squares(residual, x_start[free], jac=jacobian,
+                                    bounds=(lower[free], upper[free]), method="trf")
+    x = x_start.copy()
+    x[free] = result.x
+    p = numpy.exp(x)
+    if "f_load" not in fit and not numpy.isfinite(f_load):
+        p[3] = numpy.inf
+    fitted = numpy.full(numpy.atleast_2d(dbm).shape, numpy.nan)
+    fitted[:, f > 0] = SpectrumModel(tia, f[f > 0], RBW, P, T, termination).dbm_and_jacobian(*p)[0]
+    fitted = fitted.reshape(dbm.shape)
+    return ParasiticFit(*p, numpy.sqrt(numpy.mean(result.fun**2)), fitted, result.nfev, result.success)
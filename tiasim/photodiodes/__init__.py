@@ -7,6 +7,8 @@ class S5971(Photodiode):
         1.2 mm diameter detector
         https://www.hamamatsu.com/resources/pdf/ssd/s5971_etc_kpin1025e.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         capacitance = 4e-12 # at VR = 5 V
         responsivity = 0.4 # A/W
@@ -18,6 +20,8 @@ class S5973(Photodiode):
         0.4 mm diameter detector
         https://www.hamamatsu.com/resources/pdf/ssd/s5971_etc_kpin1025e.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         capacitance = 1.6e-12  # capacitance at Vr = 3.3V
         responsivity = 0.4     # A/W
@@ -29,6 +33,8 @@ class S905501(Photodiode):
         0.1 mm diameter detector
         https://www.hamamatsu.com/resources/pdf/ssd/s9055_series_kpin1065e.pdf
     """
+    __slots__ = ()
+
     def __init__(self):
         capacitance = 0.5e-12  # capacitance at Vr = 3.3V
         responsivity = 0.25     # A/W
@@ -43,6 +49,8 @@ class FDS015(Photodiode):
         0.65 pF capacitance at Vr = 5 V
         TO-46 package
     """
+    __slots__ = ()
+
     def __init__(self):
         capacitance = 0.65e-12
         responsivity = 0.4
@@ -57,6 +65,8 @@ class FGA01FC(Photodiode):
         2.0 pF capacitance at Vr = 5 V
         TO-46 package
     """
+    __slots__ = ()
+
     def __init__(self):
         capacitance = 2.0e-12
         responsivity = 1.0
@@ -0,0 +1,158 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Rational (pole-zero) transfer functions of TIAs built on pole-model opamps.
+
+    With open-loop gain A = Na/Da and feedback impedance ZF = R_F/Dz,
+    Dz = 1 + s R_F C_F, the closed-loop responses share one denominator
+
+        ZM   = Na R_F / (Da Dz + Na Dz + s C_tot R_F Da)
+        Avcl = Na (Dz + s C_tot R_F) / (Da Dz + Na Dz + s C_tot R_F Da)
+"""
+
+import collections
+import numpy
+
+Peak = collections.namedtuple("Peak", ["f", "magnitude", "peaking"])
+Peak.__doc__ = """
+    maximum of |H(f)|, see RationalTransfer.peak()
+    f: frequency of the maximum in Hz, 0 when |H| falls monotonically
+    magnitude: |H| at f
+    peaking: magnitude relative to |H(0)|, dB
+"""
+
+class RationalTransfer:
+    """
+        H(s) = polyval(numerator, s/w0) / polyval(denominator, s/w0)
+
+        numerator, denominator: real coefficients, highest power first (numpy.polyval order)
+        in the scaled variable s/w0, which keeps the coefficients of wideband
+        circuits within a few decades of each other.
+
+        Poles and zeros are found once, here. Evaluation uses Horner's method on
+        the stored coefficients. bandwidth(), peak(), step_response() and power()
+        are closed-form in the roots and assume distinct poles, all in the
+        left half-plane for step_response() and power().
+    """
+    def __init__(self, numerator, denominator, w0=1.0):
+        numerator = numpy.trim_zeros(numpy.atleast_1d(numpy.asarray(numerator, dtype=float)), "f")
+        denominator = numpy.trim_zeros(numpy.atleast_1d(numpy.asarray(denominator, dtype=float)), "f")
+        if len(denominator) == 0:
+            raise ValueError("zero denominator")
+        scale = denominator[0]
+        self.numerator = numerator/scale
+        self.denominator = denominator/scale
+        self.w0 = float(w0)
+        self.poles = w0*numpy.roots(self.denominator)
+        self.zeros = w0*numpy.roots(self.numerator)
+
+    @property
+    def order(self):
+        return len(self.denominator) - 1
+
+    @property
+    def dc_gain(self):
+        return self.numerator[-1]/self.denominator[-1]
+
+    def __call__(self, f):
+        """ H(j 2 pi f) """
+        return self.at_s(2j*numpy.pi*numpy.asarray(f, dtype=float))
+
+    def at_s(self, s):
+        """ H(s) at complex s in rad/s """
+        p = numpy.asarray(s)/self.w0
+        return numpy.polyval(self.numerator, p)/numpy.polyval(self.denominator, p)
+
+    def _squared(self, c):
+        """ coefficients of |c(j x)|^2 as a polynomial in x^2, highest power first """
+        n = len(c) - 1
+        powers = numpy.arange(n, -1, -1)
+        cj = c*(1j)**powers     # c(j x) in x
+        m = numpy.polymul(cj, numpy.conj(cj)).real
+        return m[::-1][::2][::-1]   # the odd powers of x cancel
+
+    def bandwidth(self):
+        """ lowest frequency in Hz where |H| = |H(0)|/sqrt(2), nan when there is none """
+        num2, den2 = self._squared(self.numerator), self._squared(self.denominator)
+        h0 = num2[-1]/den2[-1]
+        r = numpy.roots(numpy.polysub(2.0*num2, h0*den2))
+        x = r.real[(numpy.abs(r.imag) <= 1e-9*numpy.abs(r)) & (r.real > 0)]
+        if len(x) == 0:
+            return numpy.nan
+        return self.w0*numpy.sqrt(x.min())/(2.0*numpy.pi)
+
+    def peak(self):
+        """ maximum of |H(f)| over f >= 0 as a Peak, from the stationary points of |H|^2 in f^2 """
+        num2, den2 = self._squared(self.numerator), self._squared(self.denominator)
+        r = numpy.roots(numpy.polysub(numpy.polymul(numpy.polyder(num2), den2),
+                                      numpy.polymul(num2, numpy.polyder(den2))))
+        x = numpy.concatenate([[0.0], r.real[(numpy.abs(r.imag) <= 1e-9*numpy.abs(r)) & (r.real > 0)]])
+        h2 = numpy.polyval(num2, x)/numpy.polyval(den2, x)
+        k = numpy.argmax(h2)
+        return Peak(self.w0*numpy.sqrt(x[k])/(2.0*numpy.pi), numpy.sqrt(h2[k]), 10.0*numpy.log10(h2[k]/h2[0]))
+
+    def residues(self):
+        """ residues of H at its poles, for strictly proper H """
+        if len(self.numerator) >= len(self.denominator):
+            raise ValueError("transfer function is not strictly proper")
+        d = numpy.polyder(self.denominator)
+        return self.w0*numpy.polyval(self.numerator, self.poles/self.w0)/numpy.polyval(d, self.poles/self.w0)
+
+    def step_response(self, t):
+        """ response to a unit step at t=0, H(0) + sum r_k/p_k exp(p_k t), at any times t >= 0 """
+        t = numpy.asarray(t, dtype=float)
+        r = self.residues()/self.poles
+        return self.dc_gain + numpy.real(numpy.exp(numpy.multiply.outer(t, self.poles)) @ r)
+
+    def power(self, f_lo=0.0, f_hi=numpy.inf):
+        """
+            integral of |H(j 2 pi f)|^2 df from f_lo to f_hi, e.g. output noise power
+            of white input noise of unit density.
+
+            |H(jw)|^2 = sum_k -2 a_k p_k/(w^2 + p_k^2) with a_k = r_k H(-p_k),
+            which integrates to arctangents.
+        """
+        a = self.residues()*self.at_s(-self.poles)
+        q = -self.poles
+        w_lo, w_hi = 2.0*numpy.pi*f_lo, 2.0*numpy.pi*f_hi
+        span = (numpy.pi/2 if numpy.isinf(w_hi) else numpy.arctan(w_hi/q)) - numpy.arctan(w_lo/q)
+        return float(numpy.real(numpy.sum(a*span))/numpy.pi)
+
+    def enbw(self):
+        """ equivalent noise bandwidth in Hz, power() over |H(0)|^2 """
+        return self.power()/self.dc_gain**2
+
+def transfer_functions(tia, w0=None):
+    """
+        (ZM, Avcl) of tia as RationalTransfer, for opamps with a pole model (a poles attribute in Hz:
+        SinglePoleOpAmp, TwoPoleAmplifier, PoleOpamp). w0 defaults to 2 pi tia.bandwidth_approx().
+    """
+    poles = getattr(tia.opamp, "poles", None)
+    if poles is None:
+        raise ValueError("%s has no pole model" % type(tia.opamp).__name__)
+    if w0 is None:
+        w0 = 2.0*numpy.pi*tia.bandwidth_approx()
+    Na = numpy.array([tia.opamp.AOL_gain])
+    Da = numpy.array([1.0])
+    for f_p in poles:
+        Da = numpy.polymul(Da, [w0/(2.0*numpy.pi*f_p), 1.0])
+    Dz = numpy.array([w0*tia.R_F*tia.C_F, 1.0])
+    sCR = numpy.array([w0*tia.C_tot*tia.R_F, 0.0])
+    den = numpy.polyadd(numpy.polyadd(numpy.polymul(Da, Dz), numpy.polymul(Na, Dz)), numpy.polymul(sCR, Da))
+    ZM = RationalTransfer(Na*tia.R_F, den, w0)
+    Avcl = RationalTransfer(numpy.polymul(Na, numpy.polyadd(Dz, sCR)), den, w0)
+    return ZM, Avcl
@@ -1,49 +1,327 @@
+import collections
 import numpy as np
 
+EdgeMetrics = collections.namedtuple("EdgeMetrics", ["rise_time", "fall_time", "slew_rate"])
+EdgeMetrics.__doc__ = """
+    per-trace edge timing from analyze_edges()
+    rise_time: 10-90% time of rising traces, nan for falling traces
+    fall_time: 90-10% time of falling traces, nan for rising traces
+    slew_rate: 40-60% average slope, negative for falling traces
+"""
+
+Edge = collections.namedtuple("Edge", ["index", "time", "rise_time", "fall_time", "slew_rate"])
+Edge.__doc__ = """
+    one edge found by iter_edges()
+    index: sample index where the transition starts (last sample before the first level)
+    time: interpolated time of the start of the transition
+    rise_time, fall_time: 10-90% transition time, nan for the other edge direction
+    slew_rate: 40-60% average slope, negative for falling edges
+"""
+
+StepMetrics = collections.namedtuple("StepMetrics", ["rise_time", "overshoot", "settling_time"])
+StepMetrics.__doc__ = """
+    10-90% rise time, fractional overshoot and settling time of a step response
+"""
+
+def _first_above(data, value, rows, begin=None, block=1024):
+    '''
+    index of the first sample above value along the last axis of 2-D data, for each of the
+    given rows, -1 if none. The rows are scanned in blocks of samples and a row stops
+    being scanned once it is found. begin: optional per-row index before which no sample
+    of that row is above value, scanning of the row starts at its block.
+    '''
+    n = data.shape[-1]
+    index = np.full(len(rows), -1)
+    entry = np.zeros(len(rows), dtype=int) if begin is None else np.where(begin < 0, n, begin)//block*block
+    pending = np.arange(len(rows))
+    for start in range(entry.min(initial=n), n, block):
+        active = pending[entry[pending] <= start]
+        if len(active) == 0:
+            continue
+        r = rows[active]
+        if r[-1] - r[0] + 1 == len(r): # contiguous rows, slice instead of gathering a copy
+            above = data[r[0]:r[-1]+1, start:start+block] > value[r, None]
+        else:
+            above = data[r, start:start+block] > value[r, None]
+        first = above.argmax(axis=-1)
+        hit = above[np.arange(len(r)), first]
+        index[active[hit]] = start + first[hit]
+        pending = pending[index[pending] < 0]
+        if len(pending) == 0:
+            break
+    return index
+
+def _block_peaks(rows, block=512):
+    '''
+    largest sample of every block of samples of each row of 2-D rows, ignoring nan,
+    as (peaks of shape (len(rows), number of blocks), block). Rows shorter than block are one block.
+    '''
+    n = rows.shape[-1]
+    m = n//block
+    if m == 0:
+        return np.fmax.reduce(rows, axis=-1, keepdims=True), n
+    peaks = np.fmax.reduce(rows[:, :m*block].reshape(len(rows), m, block), axis=-1)
+    if n > m*block:
+        peaks = np.concatenate([peaks, np.fmax.reduce(rows[:, m*block:], axis=-1, keepdims=True)], axis=1)
+    return peaks, block
+
+def _scan_peaks(rows, value, reverse, peaks):
+    '''
+    _scan() from the block peaks of _block_peaks(): the first block in scan order with
+    a peak above value holds the crossing, which is then looked for in that block only
+    '''
+    peaks, block = peaks
+    n = rows.shape[-1]
+    r = np.arange(len(rows))
+    above = peaks > value[:, None]
+    b = np.where(reverse, peaks.shape[-1] - 1 - above[:, ::-1].argmax(axis=-1), above.argmax(axis=-1))
+    found = above[r, b]
+    # a window of one block, moved back from the end of the row for the last, shorter block:
+    # the samples it takes from the neighbouring block are not above value
+    start = np.minimum(b*block, n - block)
+    window = np.lib.stride_tricks.sliding_window_view(rows, block, axis=-1)[r, start] > value[:, None]
+    index = start + window.argmax(axis=-1)
+    back = np.flatnonzero(reverse)
+    index[back] = n - 1 - (start[back] + block - 1 - window[back, ::-1].argmax(axis=-1))
+    return np.where(found, index, -1)
+
+_whole_rows = 1 << 15   # longest rows searched through block peaks, see _scan()
+
+def _scan(rows, value, reverse, begin=None, peaks=None):
+    '''
+    first sample of each row of 2-D rows above value, counted in scan order:
+    from the end for reversed rows. -1 where there is none.
+    Rows of up to _whole_rows samples are searched through their block peaks, which
+    several levels can share (peaks from _block_peaks()). Longer rows are scanned
+    block by block and each row only up to its crossing, from begin if given.
+    '''
+    if rows.shape[-1] <= _whole_rows:
+        return _scan_peaks(rows, value, reverse, _block_peaks(rows) if peaks is None else peaks)
+    index = np.full(len(rows), -1)
+    for flip in (False, True):
+        sel = np.flatnonzero(reverse == flip)
+        if len(sel):
+            index[sel] = _first_above(rows[:, ::-1] if flip else rows, value, sel,
+                                      None if begin is None else begin[sel])
+    return index
+
+def _interpolate(x, rows, value, reverse, index):
+    ''' x of the crossing found by _scan(), linearly interpolated with the previous sample in scan order '''
+    n = rows.shape[-1]
+    found = index >= 0
+    i1 = np.where(found, np.where(reverse, n - 1 - index, index), 0)
+    i0 = np.clip(np.where(reverse, i1 + 1, i1 - 1), 0, n - 1)
+    r = np.arange(len(rows))
+    y0, y1 = rows[r, i0], rows[r, i1]
+    if x.ndim == 1:
+        x0, x1 = x[i0], x[i1]
+    else:
+        xr = x.reshape(-1, n)
+        x0, x1 = xr[r, i0], xr[r, i1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(y1 != y0, (value - y0)/(y1 - y0), 0.0)
+    return np.where(found, x0 + frac*(x1 - x0), np.nan)
+
+def _as_rows(x, data, *per_trace):
+    data = np.asarray(data, dtype=float)
+    x = np.asarray(x, dtype=float)
+    batch = data.shape[:-1]
+    if x.ndim > 1:
+        x = np.broadcast_to(x, data.shape)
+    rows = data.reshape(-1, data.shape[-1])
+    return (x, rows, batch) + tuple(np.broadcast_to(np.asarray(p), batch).reshape(-1) for p in per_trace)
+
+def first_crossing(x, data, value, reverse=False):
+    '''
+    first x where data rises above value along the last axis,
+    linearly interpolated between samples. nan where data never exceeds value.
+    x is 1-D (shared) or has the shape of data, value broadcasts against data[..., 0].
+    reverse: search from the end of each trace instead, a bool or one per trace.
+    '''
+    x, rows, batch, value, reverse = _as_rows(x, data, np.asarray(value, dtype=float), np.asarray(reverse, dtype=bool))
+    index = _scan(rows, value, reverse)
+    return _interpolate(x, rows, value, reverse, index).reshape(batch)[()]
 
 # Step Resonse Tools
+# All functions take a single trace or a batch of traces along the leading axes of data,
+# with x either shared (1-D) or given per trace.
 def get_signal_start_end(data, n=8):
-    low = np.mean(data[:n])
-    high = np.mean(data[-n:])
+    data = np.asarray(data, dtype=float)
+    low = np.mean(data[..., :n], axis=-1)
+    high = np.mean(data[..., -n:], axis=-1)
     return low, high
 
 def get_percent_value(data, percent, n=8):
     start, end = get_signal_start_end(data, n)
-    return np.abs(start - end)*percent/100. + min([start, end])
+    return _percent_value(start, end, percent)
+
+def _percent_value(start, end, percent):
+    return np.abs(start - end)*percent/100. + np.minimum(start, end)
 
 def get_first_higher_value(value, x, data):
-    for xp, p in zip(x, data):
-        if p > value:
-            return xp
-    raise UserWarning("get_first_higher_value Failed")
-
-def get_slew_by_mode(mode, x, data, percents=(10,90)):
-    ninetyPercent = get_percent_value(data, max(percents))
-    tenPercent = get_percent_value(data, min(percents))
-    assert(ninetyPercent > tenPercent)
-
-    if mode == 'RISING':
-        tenPercentPos = get_first_higher_value(tenPercent, x, data)
-        ninetyPercentPos = get_first_higher_value(ninetyPercent, x, data)
-    elif mode == 'FALLING':
-        tenPercentPos = get_first_higher_value(tenPercent, x[::-1], data[::-1])
-        ninetyPercentPos = get_first_higher_value(ninetyPercent, x[::-1], data[::-1])
+    '''first x where data exceeds value, interpolated between samples, nan if never'''
+    return first_crossing(x, data, value)
+
+def is_rising(data):
+    data = np.asarray(data)
+    return data[..., -1] > data[..., 0]
+
+def get_slew_by_mode(mode, x, data, percents=(10,90), n=8):
+    '''
+    positions and values of the max(percents) and min(percents) levels
+    mode: 'RISING', 'FALLING' or a boolean array, True for rising traces
+    Falling traces are searched from the end. Positions are nan where a level
+    is not crossed or the trace has no step.
+    '''
+    data = np.asarray(data, dtype=float)
+    if isinstance(mode, str):
+        if mode not in ('RISING', 'FALLING'):
+            raise ValueError('unknown mode %s'%mode)
+        rising = np.full(data.shape[:-1], mode == 'RISING')
     else:
-        raise UserWarning('unknown mode %s'%mode)
+        rising = np.asarray(mode, dtype=bool)
+    return _levels(x, data, rising, [percents], n)[0]
 
-    return (ninetyPercentPos, ninetyPercent), (tenPercentPos, tenPercent)
+def _levels(x, data, rising, percent_pairs, n):
+    '''
+    get_slew_by_mode() for several (low, high) percent pairs of the same traces,
+    which share the start/end levels and the block peaks of one pass over the data
+    '''
+    start, end = get_signal_start_end(data, n)
+    x, rows, batch, reverse = _as_rows(x, data, ~rising)
+    peaks = _block_peaks(rows) if rows.shape[-1] <= _whole_rows else None
+    result = []
+    for percents in percent_pairs:
+        ninetyPercent = _percent_value(start, end, max(percents))
+        tenPercent = _percent_value(start, end, min(percents))
+        step = (ninetyPercent > tenPercent).reshape(-1)
+        lo, hi = np.broadcast_to(tenPercent, batch).reshape(-1), np.broadcast_to(ninetyPercent, batch).reshape(-1)
+        lo_index = _scan(rows, lo, reverse, peaks=peaks)
+        # any sample above the high level is above the low level, so its search can start there
+        hi_index = _scan(rows, hi, reverse, begin=lo_index, peaks=peaks)
+        tenPercentPos = np.where(step, _interpolate(x, rows, lo, reverse, lo_index), np.nan).reshape(batch)[()]
+        ninetyPercentPos = np.where(step, _interpolate(x, rows, hi, reverse, hi_index), np.nan).reshape(batch)[()]
+        result.append(((ninetyPercentPos, ninetyPercent), (tenPercentPos, tenPercent)))
+    return result
 
 def find_rise_time(x, y):
-    mode = 'FALLING'
-    if y[-1] > y[0]:
-        mode = 'RISING'
-    (ninetyPercentPos, ninetyPercent), (tenPercentPos, tenPercent) = get_slew_by_mode(mode, x, y)
-    return abs(ninetyPercentPos - tenPercentPos)
+    '''10-90% transition time of each trace, rising or falling'''
+    (ninetyPercentPos, ninetyPercent), (tenPercentPos, tenPercent) = get_slew_by_mode(is_rising(y), x, y)
+    return np.abs(ninetyPercentPos - tenPercentPos)
 
 def calc_slew_rate(x, y):
-    mode = 'FALLING'
-    if y[-1] > y[0]:
-        mode = 'RISING'
-    (sixtyPercentPos, sixtyPercent), (fortyPercentPos, fortyPercent) = get_slew_by_mode(mode, x, y, percents=[40, 60])
-    average_slew_rate = abs(sixtyPercent-fortyPercent)/float(sixtyPercentPos-fortyPercentPos)
+    '''average slope between the 40% and 60% levels, negative for falling traces'''
+    (sixtyPercentPos, sixtyPercent), (fortyPercentPos, fortyPercent) = get_slew_by_mode(is_rising(y), x, y, percents=[40, 60])
+    average_slew_rate = np.abs(sixtyPercent-fortyPercent)/(sixtyPercentPos-fortyPercentPos)
     return average_slew_rate
+
+def analyze_edges(x, y, percents=(10,90), slew_percents=(40,60), n=8):
+    '''
+    rise time, fall time and slew rate of every trace in y in one call, as an EdgeMetrics
+    y: 1-D trace or 2-D array with one trace per row
+    x: sample times, shared 1-D or one row per trace
+    n: number of samples averaged at each end to find the start and end levels
+    '''
+    y = np.asarray(y, dtype=float)
+    rising = is_rising(y)
+    ((hi_pos, hi), (lo_pos, lo)), ((s_hi_pos, s_hi), (s_lo_pos, s_lo)) = _levels(x, y, rising, [percents, slew_percents], n)
+    transition = np.abs(hi_pos - lo_pos)
+    slew_rate = np.abs(s_hi - s_lo)/(s_hi_pos - s_lo_pos)
+    return EdgeMetrics(np.where(rising, transition, np.nan)[()],
+                       np.where(rising, np.nan, transition)[()],
+                       slew_rate)
+
+def step_metrics(t, y, final=None, settle=0.02):
+    '''
+    rise time, overshoot and settling time of step responses y sampled at times t
+    y can be a batch of responses along the leading axes, t is shared.
+    final: settled value, defaults to the last sample of each response
+    settle: settling band as a fraction of the final value
+    '''
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if final is None:
+        final = y[..., -1]
+    yn = y/np.asarray(final)[..., None]
+    rise_time = first_crossing(t, yn, 0.9) - first_crossing(t, yn, 0.1)
+    overshoot = np.maximum(yn.max(axis=-1) - 1.0, 0.0)
+    outside = np.abs(yn - 1.0) > settle
+    last = yn.shape[-1] - 1 - outside[..., ::-1].argmax(axis=-1)
+    settled = ~outside[..., -1]
+    settling_time = np.where(outside.any(axis=-1), t[np.minimum(last + 1, len(t) - 1)], t[0])
+    return StepMetrics(rise_time, overshoot[()], np.where(settled, settling_time, np.nan)[()])
+
+def _transitions(w, lower, upper):
+    '''
+    hysteresis transitions of w between below lower and above upper
+    returns (a, b, rising): a the last sample on the old side, b the first on the new side
+    '''
+    state = np.where(w > upper, 1, 0) - np.where(w < lower, 1, 0)
+    idx = np.flatnonzero(state)
+    s = state[idx]
+    k = np.flatnonzero(s[1:] != s[:-1])
+    return idx[k], idx[k + 1], s[k + 1] > 0
+
+def _level_time(w, i, level):
+    ''' fractional sample position where w crosses level between samples i and i+1 '''
+    y0, y1 = w[i], w[i + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return i + np.where(y1 != y0, (level - y0)/(y1 - y0), 0.0)
+
+def iter_edges(source, dt, dtype='int16', offset=0, scale=1.0, zero=0.0, levels=None,
+               chunk_size=2**20, overlap=2**16, percents=(10,90), slew_percents=(40,60)):
+    '''
+    generator of an Edge for every rising and falling edge in a long capture
+
+    source: path of a raw binary capture, memory-mapped read-only, or an array
+    dt: sample interval in s
+    dtype, offset: sample type and header size in bytes of the raw file
+    scale, zero: samples are converted to volts as zero + scale*sample
+    levels: (low, high) settled signal levels in volts. By default the 1st and 99th
+            percentiles of the first chunk.
+    chunk_size: samples analysed per step. Each step also re-reads overlap samples
+            before the chunk so that edges across chunk boundaries are found. Edges
+            longer than overlap are not reported.
+
+    Edges are reported once, in the step containing their last sample. Memory use is
+    set by chunk_size + overlap, independent of the capture length.
+    '''
+    if isinstance(source, np.ndarray):
+        data = source
+    else:
+        data = np.memmap(source, dtype=dtype, mode='r', offset=offset)
+    n = len(data)
+    if levels is None:
+        levels = np.percentile(zero + scale*np.asarray(data[:chunk_size], dtype=float), [1, 99])
+    low, high = levels
+    def level(percent):
+        return low + (high - low)*percent/100.
+    lo, hi = level(min(percents)), level(max(percents))
+    s_lo, s_hi = level(min(slew_percents)), level(max(slew_percents))
+
+    for c0 in range(0, n, chunk_size):
+        w0 = max(c0 - overlap, 0)
+        w = zero + scale*np.asarray(data[w0:min(c0 + chunk_size, n)], dtype=float)
+        a, b, rising = _transitions(w, lo, hi)
+        keep = b + w0 >= c0
+        a, b, rising = a[keep], b[keep], rising[keep]
+        if len(a) == 0:
+            continue
+        t_start = _level_time(w, a, np.where(rising, lo, hi))
+        t_end = _level_time(w, b - 1, np.where(rising, hi, lo))
+
+        sa, sb, s_rising = _transitions(w, s_lo, s_hi)
+        j = np.minimum(np.searchsorted(sb, a, side='right'), max(len(sb) - 1, 0))
+        slew_rate = np.full(len(a), np.nan)
+        if len(sb):
+            ok = (sb[j] <= b) & (s_rising[j] == rising)
+            t0 = _level_time(w, sa[j], np.where(rising, s_lo, s_hi))
+            t1 = _level_time(w, sb[j] - 1, np.where(rising, s_hi, s_lo))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = np.where(rising, s_hi - s_lo, s_lo - s_hi)/((t1 - t0)*dt)
+            slew_rate = np.where(ok, slope, np.nan)
+        transition = (t_end - t_start)*dt
+        rise_time = np.where(rising, transition, np.nan)
+        fall_time = np.where(rising, np.nan, transition)
+        for edge in zip(a + w0, (t_start + w0)*dt, rise_time, fall_time, slew_rate):
+            yield Edge(*edge)
@@ -0,0 +1,235 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import concurrent.futures
+import glob
+import os
+import numpy
+from scipy import signal
+
+class SpectrumMetadata(collections.namedtuple("SpectrumMetadata", [
+        "machine", "y_scale", "y_unit", "impedance", "n_points", "sweep_time",
+        "start_frequency", "stop_frequency", "offset_frequency", "average_type",
+        "rbw", "vbw", "preamp", "ref_level", "attenuation",
+        "trace_names", "trace_detectors", "comments"])):
+    """
+        header of a Siglent SSA3021X CSV export
+        frequencies in Hz, impedance in Ohm, sweep_time in s, ref_level in y_unit,
+        attenuation in dB. comments holds the free-text '#' lines before the header.
+    """
+    __slots__ = ()
+
+    @property
+    def span(self):
+        return self.stop_frequency - self.start_frequency
+
+Spectrum = collections.namedtuple("Spectrum", ["metadata", "frequency", "traces"])
+Spectrum.__doc__ = """
+    one spectrum analyzer export: SpectrumMetadata, frequency (n_points,)
+    and traces (n_traces, n_points), in metadata.y_unit (e.g. dBm)
+"""
+
+SpectrumStack = collections.namedtuple("SpectrumStack", ["paths", "metadata", "frequency", "traces"])
+SpectrumStack.__doc__ = """
+    spectra of many files sharing one frequency grid:
+    paths and metadata per file, frequency (n_points,), traces (n_files, n_traces, n_points)
+"""
+
+def _on(value):
+    return value.strip().upper() == "ON"
+
+# header key: (SpectrumMetadata field, converter)
+_header_fields = {
+    "Machine Module": ("machine", str),
+    "Y Axis Scale": ("y_scale", str),
+    "Y Axis Unit": ("y_unit", str),
+    "Impedance": ("impedance", float),
+    "Number of Points": ("n_points", int),
+    "Sweep Time(s)": ("sweep_time", float),
+    "Start Frequency": ("start_frequency", float),
+    "Stop Frequency": ("stop_frequency", float),
+    "Offset Frequency": ("offset_frequency", float),
+    "Average Type": ("average_type", str),
+    "RBW": ("rbw", float),
+    "VBW": ("vbw", float),
+    "PreAmp State": ("preamp", _on),
+    "Ref Level": ("ref_level", float),
+    "Attenuation": ("attenuation", float),
+}
+
+def parse_header(lines):
+    """ SpectrumMetadata from the '#' header lines of an export, with the '#' included """
+    values = dict.fromkeys(SpectrumMetadata._fields)
+    values["trace_names"] = values["trace_detectors"] = ()
+    comments = []
+    in_header = False
+    for line in lines:
+        fields = [x.strip() for x in line.lstrip("#").split(",")]
+        key = fields[0]
+        if key in _header_fields:
+            in_header = True
+            name, convert = _header_fields[key]
+            values[name] = convert(fields[1])
+        elif key == "Trace Name":
+            values["trace_names"] = tuple(fields[1:])
+        elif key == "Trace Detector":
+            values["trace_detectors"] = tuple(fields[1:])
+        elif not in_header:
+            comments.append(line.lstrip("#").strip())
+    values["comments"] = tuple(c for c in comments if c)
+    return SpectrumMetadata(**values)
+
+def read_spectrum(path):
+    """
+        read a Siglent SSA3021X CSV export into a Spectrum
+        The data block is parsed in one numpy.fromstring() call.
+    """
+    with open(path) as f:
+        text = f.read()
+    start = 0
+    header = []
+    while text.startswith("#", start):
+        end = text.find("\n", start)
+        end = len(text) if end < 0 else end
+        header.append(text[start:end].rstrip("\r"))
+        start = end + 1
+    metadata = parse_header(header)
+    body = text[start:]
+    first = body[:body.find("\n")] if "\n" in body else body
+    n_columns = first.count(",") + 1
+    data = numpy.fromstring(body.replace("\n", ","), sep=",")
+    if data.size % n_columns:
+        raise ValueError("%s: ragged data block" % path)
+    data = data.reshape(-1, n_columns)
+    return Spectrum(metadata, data[:, 0], numpy.ascontiguousarray(data[:, 1:].T))
+
+def load_spectra(paths, workers=None, chunksize=16):
+    """
+        read many exports into one SpectrumStack, in worker processes unless workers=1
+
+        paths: a directory (all *.csv files in it, sorted) or a sequence of files.
+        All files must share one frequency grid and number of traces.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = sorted(glob.glob(os.path.join(paths, "*.csv")))
+    paths = list(paths)
+    if not paths:
+        raise ValueError("no spectrum files")
+    if workers == 1:
+        spectra = [read_spectrum(p) for p in paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            spectra = list(pool.map(read_spectrum, paths, chunksize=chunksize))
+
+    frequency = spectra[0].frequency
+    traces = numpy.empty((len(spectra),) + spectra[0].traces.shape)
+    for k, s in enumerate(spectra):
+        if s.traces.shape != traces.shape[1:] or not numpy.array_equal(s.frequency, frequency):
+            raise ValueError("%s: frequency grid or traces differ from %s" % (paths[k], paths[0]))
+        traces[k] = s.traces
+    return SpectrumStack(paths, [s.metadata for s in spectra], frequency, traces)
+
+class SpectrumAnalyzer:
+    """
+        emulation of a swept spectrum analyzer displaying a noise density
+
+        frequency: the analyzer's (uniformly spaced) display points in Hz
+        rbw, vbw: resolution and video bandwidth in Hz, vbw=None for no video filter
+        sweep_time: in s, sets the video filter's smoothing along the sweep
+        floor: analyzer noise floor in dBm, scalar or one value per display point
+               (e.g. a measured floor trace); None for a noiseless analyzer
+        log_average: video filtering on the log (dB) scale, as 'Log Pwr' averaging.
+                     Noise then reads log_bias dB low, 2.51 dB for fully averaged noise.
+        termination: as in v_to_dbm(), the 50 Ohm load halves the voltage
+
+        display() convolves the model power spectral density with a Gaussian RBW
+        filter (power response exp(-4 ln2 (df/rbw)^2), noise bandwidth 1.065 rbw) on a
+        uniform grid through the display points, fine enough to resolve the filter,
+        using FFT convolution on large grids. The video filter is a single-pole IIR
+        along the sweep, and the floor is added as power.
+    """
+    def __init__(self, frequency, rbw, vbw=None, sweep_time=None, floor=None, log_average=True,
+                 log_bias=2.51, impedance=50.0, termination=True, oversample=8):
+        self.frequency = numpy.asarray(frequency, dtype=float)
+        self.rbw = rbw
+        self.vbw = vbw
+        self.sweep_time = sweep_time
+        self.floor = floor
+        self.log_average = log_average
+        self.log_bias = log_bias
+        self.impedance = impedance
+        self.termination = termination
+        self.oversample = oversample
+
+    @classmethod
+    def from_metadata(cls, metadata, floor=None, **kwargs):
+        """ analyzer with the display points, RBW, VBW, sweep time and averaging of a SpectrumMetadata """
+        frequency = numpy.linspace(metadata.start_frequency, metadata.stop_frequency, metadata.n_points)
+        log_average = (metadata.average_type or "Log Pwr").lower().startswith("log")
+        return cls(frequency, metadata.rbw, metadata.vbw, metadata.sweep_time, floor, log_average, **kwargs)
+
+    def grid(self):
+        """ uniform frequency grid containing every display point, with spacing at most rbw/oversample """
+        f = self.frequency
+        step = (f[-1] - f[0])/(len(f) - 1) if len(f) > 1 else self.rbw
+        n_sub = max(1, int(numpy.ceil(step*self.oversample/self.rbw)))
+        df = step/n_sub
+        n_pad = int(numpy.ceil(4.0*self.rbw/df))
+        return f[0] + df*numpy.arange(-n_pad, (len(f) - 1)*n_sub + n_pad + 1), n_sub, n_pad
+
+    def display(self, psd):
+        """
+            analyzer trace in dBm for the output noise density psd, a callable f -> V/sqrt(Hz)
+            such as lambda f: tia.bright_noise(P, f). psd is only evaluated at f > 0.
+        """
+        f, n_sub, n_pad = self.grid()
+        df = f[1] - f[0]
+        power = numpy.zeros(len(f))
+        positive = f > 0
+        scale = (0.25 if self.termination else 1.0)/self.impedance/1e-3
+        power[positive] = numpy.square(numpy.abs(psd(f[positive])))*scale    # mW/Hz
+
+        offset = df*numpy.arange(-n_pad, n_pad + 1)
+        kernel = numpy.exp(-4.0*numpy.log(2.0)*numpy.square(offset/self.rbw))*df
+        if len(f) > 4096 and len(kernel) > 64:
+            power = signal.fftconvolve(power, kernel, mode="same")
+        else:
+            power = numpy.convolve(power, kernel, mode="same")
+        power = numpy.maximum(power, 0.0)   # FFT round-off
+
+        if self.floor is not None:
+            floor = numpy.broadcast_to(numpy.asarray(self.floor, dtype=float), self.frequency.shape)
+            power += numpy.interp(f, self.frequency, 10.0**(floor/10.0))
+
+        with numpy.errstate(divide="ignore"):
+            video = 10.0*numpy.log10(power) if self.log_average else power
+        if self.vbw is not None and self.sweep_time:
+            # single-pole video filter, time constant 1/(2 pi vbw), along the sweep
+            sweep_rate = (self.frequency[-1] - self.frequency[0])/self.sweep_time
+            alpha = 1.0 - numpy.exp(-df*2.0*numpy.pi*self.vbw/sweep_rate)
+            b, a = [alpha], [1.0, alpha - 1.0]
+            finite = numpy.isfinite(video)
+            start = video[finite][0] if finite.any() else 0.0
+            video, _ = signal.lfilter(b, a, numpy.where(finite, video, start), zi=[start*(1.0 - alpha)])
+        points = slice(n_pad, len(f) - n_pad, n_sub)
+        with numpy.errstate(divide="ignore"):
+            dbm = video[points] if self.log_average else 10.0*numpy.log10(video[points])
+        if self.log_average:
+            dbm = dbm - self.log_bias
+        return dbm
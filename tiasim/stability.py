@@ -0,0 +1,143 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Loop stability of the TIA feedback loop.
+
+    The feedback fraction is beta = 1/(1 + j w ZF C_tot), so the loop gain is
+    A beta and the noise gain 1/beta. The opamp voltage noise reaches the
+    output through Avcl = (1/beta) A beta/(1 + A beta), which peaks near the
+    unity-loop-gain crossover when the phase margin is small.
+"""
+
+import collections
+import numpy
+
+Stability = collections.namedtuple("Stability", ["f_crossover", "phase_margin", "f_noise_peak",
+                                                 "noise_gain_peak", "Q", "stable"])
+Stability.__doc__ = """
+    loop stability metrics, see stability()
+    f_crossover: frequency of unity loop gain |A beta| = 1, Hz
+    phase_margin: 180 degrees plus the loop phase at f_crossover, degrees
+    f_noise_peak, noise_gain_peak: frequency (Hz) and magnitude (V/V) of the maximum of |Avcl|
+    Q: closed-loop Q of the equivalent two-pole loop, sqrt(cos PM)/sin PM
+    stable: phase_margin > 0
+    All fields are nan (stable False) for designs without a crossover in the search range.
+"""
+
+def calc_loop_gain(f, gain_f, z_f, c_tot):
+    """
+    loop gain A beta, with feedback fraction beta = 1/(1 + j w ZF C_tot)
+    f: frequency
+    gain_f: open-loop gain at f
+    z_f: total feedback impedance at f
+    c_tot: total source capacitance
+    """
+    w = 2.0*numpy.pi*f
+    return gain_f / (1.0 + 1j*w*z_f*c_tot)
+
+def quality_factor(phase_margin):
+    """
+    closed-loop Q of a two-pole loop with the given phase margin in degrees,
+    sqrt(cos PM)/sin PM. 0 at and above 90 degrees, inf at and below 0.
+    """
+    pm = numpy.radians(numpy.asarray(phase_margin, dtype=float))
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        q = numpy.sqrt(numpy.maximum(numpy.cos(pm), 0.0))/numpy.sin(pm)
+    return numpy.where(pm <= 0, numpy.inf, q)
+
+def crossover(loop_gain, f_lo, f_hi, rtol=1e-6, max_iter=100):
+    """
+    vectorized root of ln|loop_gain(f)| = 0 in ln f between f_lo (gain above 1)
+    and f_hi (gain below 1), by the Illinois variant of regula falsi.
+    loop_gain(f) evaluates one frequency per element of the bracket arrays.
+    ln|A beta| is close to linear in ln f, so this takes a few iterations where
+    bisection takes about log2(ln(f_hi/f_lo)/rtol).
+    """
+    x_lo, x_hi = numpy.log(f_lo), numpy.log(f_hi)
+    g_lo = numpy.log(numpy.abs(loop_gain(f_lo)))
+    g_hi = numpy.log(numpy.abs(loop_gain(f_hi)))
+    side = numpy.zeros(numpy.shape(x_lo))
+    x = x_hi
+    for _ in range(max_iter):
+        x = x_hi - g_hi*(x_hi - x_lo)/(g_hi - g_lo)
+        g = numpy.log(numpy.abs(loop_gain(numpy.exp(x))))
+        if numpy.all((numpy.abs(g) < 0.5*rtol) | (x_hi - x_lo < rtol)):
+            break
+        high = g < 0
+        # Illinois: halve the stale end's value when the same end moves twice in a row
+        g_lo = numpy.where(high & (side > 0), 0.5*g_lo, g_lo)
+        g_hi = numpy.where(~high & (side < 0), 0.5*g_hi, g_hi)
+        x_hi, g_hi = numpy.where(high, x, x_hi), numpy.where(high, g, g_hi)
+        x_lo, g_lo = numpy.where(high, x_lo, x), numpy.where(high, g_lo, g)
+        side = numpy.where(high, 1.0, -1.0)
+    return numpy.exp(x)
+
+def golden_max(function, f_lo, f_hi, rtol=1e-6):
+    """ vectorized golden-section search in ln f for the maximum of function(f) between f_lo and f_hi """
+    r = 0.5*(numpy.sqrt(5.0) - 1.0)
+    a, b = numpy.log(f_lo), numpy.log(f_hi)
+    width = numpy.nanmax(b - a, initial=0.0)
+    n_iter = int(numpy.ceil(numpy.log(width/rtol)/numpy.log(1.0/r))) if width > rtol else 0
+    c, d = b - r*(b - a), a + r*(b - a)
+    v_c, v_d = function(numpy.exp(c)), function(numpy.exp(d))
+    for _ in range(n_iter):
+        left = v_c > v_d    # the maximum is in [a, d], otherwise in [c, b]
+        a, b = numpy.where(left, a, c), numpy.where(left, d, b)
+        kept, v_kept = numpy.where(left, c, d), numpy.where(left, v_c, v_d)
+        new = numpy.where(left, b - r*(b - a), a + r*(b - a))
+        v_new = function(numpy.exp(new))
+        c, v_c = numpy.where(left, new, kept), numpy.where(left, v_new, v_kept)
+        d, v_d = numpy.where(left, kept, new), numpy.where(left, v_kept, v_new)
+    return numpy.exp(0.5*(a + b))
+
+def stability(response, C_tot, f_min=1e1, f_max=1e10, rtol=1e-6, peak_span=30.0):
+    """
+        loop stability metrics as a Stability of arrays shaped like C_tot
+
+        response(f): TIA response dict (gain, ZF, Avcl) evaluated elementwise,
+                     one frequency per design, see TIAEnsemble.response(per_design=True)
+        The crossover is solved for between f_min and f_max, and the noise-gain
+        peak searched for within peak_span times either side of it.
+        The loop phase at the crossover is taken in (-360, 0] degrees.
+    """
+    C_tot = numpy.asarray(C_tot, dtype=float)
+
+    def loop_gain(f):
+        r = response(f)
+        return calc_loop_gain(f, r["gain"], r["ZF"], C_tot)
+
+    f_lo = numpy.full(C_tot.shape, float(f_min))
+    f_hi = numpy.full(C_tot.shape, float(f_max))
+    found = (numpy.abs(loop_gain(f_lo)) > 1.0) & (numpy.abs(loop_gain(f_hi)) < 1.0)
+    # designs without a crossover get a dummy bracket and are masked out afterwards
+    f_lo = numpy.where(found, f_lo, 0.5)
+    f_hi = numpy.where(found, f_hi, 2.0)
+    safe = lambda f: numpy.where(found, loop_gain(f), 1.0/f)
+    f_c = crossover(safe, f_lo, f_hi, rtol)
+
+    phase = numpy.degrees(numpy.angle(loop_gain(f_c)))
+    phase = numpy.where(phase > 0, phase - 360.0, phase)
+    phase_margin = 180.0 + phase
+
+    noise_gain = lambda f: numpy.abs(response(f)["Avcl"])
+    f_peak = golden_max(noise_gain, f_c/peak_span, f_c*peak_span, rtol)
+    peak = noise_gain(f_peak)
+
+    nan = lambda x: numpy.where(found, x, numpy.nan)
+    phase_margin = nan(phase_margin)
+    return Stability(nan(f_c), phase_margin, nan(f_peak), nan(peak), nan(quality_factor(phase_margin)),
+                     found & (phase_margin > 0))
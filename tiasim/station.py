@@ -0,0 +1,135 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+
+    Production test station: fit every measured unit and flag outliers.
+"""
+
+import csv
+import glob
+import os
+import numpy
+
+from .tiasim import find_bandwidth
+from .ensemble import TIAEnsemble
+from .parasitics import fit_parasitics
+from .spectrum import read_spectrum
+from .sweep import run_chunks
+
+station_dtype = numpy.dtype([
+    ("unit", "U64"),            # file name without extension
+    ("C_F_parasitic", "f8"),    # fitted, absorbs any C_F deviation from nominal
+    ("C_tot", "f8"),
+    ("gain_scale", "f8"),
+    ("f_load", "f8"),
+    ("bandwidth", "f8"),        # -3 dB bandwidth of the fitted model incl. load pole, Hz
+    ("noise_floor", "f8"),      # median measured dark level over the fitted band, dBm
+    ("rms", "f8"),              # fit residual, dB
+    ("outlier", "?"),
+    ("reason", "U256"),         # why the unit was flagged, ';'-separated
+])
+
+# station fields that Monte Carlo limits can be set on
+limit_fields = ("C_F_parasitic", "C_tot", "gain_scale", "bandwidth")
+
+def monte_carlo_limits(result, tia, q=(0.5, 99.5)):
+    """
+        acceptance ranges (low, high) for limit_fields from a tiasim.montecarlo result of the design tia
+
+        The station fits C_F with the nominal component value held fixed, so the
+        C_F_parasitic limits cover the total feedback capacitance spread.
+    """
+    s = result.samples
+    C_F = tia.C_F - tia.C_F_parasitic
+    values = {"C_F_parasitic": s["C_F"] + s["C_F_parasitic"] - C_F,
+              "C_tot": s["C_D"] + tia.opamp.input_capacitance(),
+              "gain_scale": s["gain_scale"],
+              "bandwidth": s["bandwidth"]}
+    return {name: tuple(numpy.nanpercentile(values[name], q)) for name in limit_fields}
+
+def screen_units(paths, tia, traces=(1,), P=(0.0,), limits=None, max_rms=3.0,
+                 floor_trace=None, floor_margin=3.0, f_range=(0.0, numpy.inf),
+                 workers=None, chunk_size=64, callback=None, summary=None):
+    """
+        fit every unit's spectrum export and flag outliers
+
+        paths: directory of *.csv spectrum analyzer exports, or a sequence of files
+        tia: nominal TIA design
+        traces, P: trace indices to fit and the optical power of each, e.g. dark (1,), (0.0,)
+        limits: dict of field name to (low, high), e.g. from monte_carlo_limits()
+        max_rms: fits with a larger rms residual in dB are flagged
+        floor_trace: trace index of the analyzer floor; points within floor_margin dB
+                     of it are not fitted
+        f_range: (f_min, f_max) of the fitted points
+        workers, chunk_size, callback: see tiasim.sweep.run_chunks()
+        summary: optional path of a CSV summary table, see write_summary()
+
+        Returns a structured array with station_dtype, in the order of paths.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = sorted(glob.glob(os.path.join(paths, "*.csv")))
+    paths = list(paths)
+    options = dict(traces=tuple(traces), P=tuple(P), limits=dict(limits or {}), max_rms=max_rms,
+                   floor_trace=floor_trace, floor_margin=floor_margin, f_range=tuple(f_range))
+    results = numpy.empty(len(paths), dtype=station_dtype)
+    run_chunks(_screen_chunk, (paths, tia, options), results, chunk_size, workers, callback)
+    if summary is not None:
+        write_summary(summary, results)
+    return results
+
+def write_summary(path, results):
+    """ write station results as a CSV table, one row per unit """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(results.dtype.names)
+        for row in results:
+            writer.writerow([("%.6g" % x) if isinstance(x, float) else x for x in row.tolist()])
+
+def _screen_chunk(context, start, stop):
+    paths, tia, options = context
+    out = numpy.empty(stop-start, dtype=station_dtype)
+    for k, path in enumerate(paths[start:stop]):
+        out[k] = _screen_unit(path, tia, **options)
+    return out
+
+def _screen_unit(path, tia, traces, P, limits, max_rms, floor_trace, floor_margin, f_range):
+    unit = os.path.splitext(os.path.basename(path))[0]
+    spectrum = read_spectrum(path)
+    f = spectrum.frequency
+    data = spectrum.traces[list(traces)]
+    mask = (f > f_range[0]) & (f < f_range[1])
+    if floor_trace is not None:
+        mask &= numpy.all(data > spectrum.traces[floor_trace] + floor_margin, axis=0)
+    if mask.sum() < 8:
+        return (unit,) + (numpy.nan,)*7 + (True, "too few points above floor")
+
+    fit = fit_parasitics(tia, f, data, spectrum.metadata.rbw, P, mask=mask)
+    unit_tia = TIAEnsemble(tia.opamp, tia.diode, tia.R_F, tia.C_F - tia.C_F_parasitic, fit.C_F_parasitic,
+                           C_D=fit.C_tot - tia.opamp.input_capacitance(), gain_scale=fit.gain_scale)
+    bandwidth = find_bandwidth(lambda fx: numpy.abs(unit_tia.ZM(fx))/numpy.sqrt(1.0 + (fx/fit.f_load)**2)).f_3dB
+    noise_floor = numpy.median(spectrum.traces[traces[0]][mask])
+
+    row = {"C_F_parasitic": fit.C_F_parasitic, "C_tot": fit.C_tot, "gain_scale": fit.gain_scale,
+           "bandwidth": bandwidth}
+    reasons = []
+    if not fit.success or fit.rms > max_rms:
+        reasons.append("fit rms %.2g dB" % fit.rms)
+    for name, (low, high) in sorted(limits.items()):
+        value = row[name]
+        if not low <= value <= high:
+            reasons.append("%s %.4g outside [%.4g, %.4g]" % (name, value, low, high))
+    return (unit, fit.C_F_parasitic, fit.C_tot, fit.gain_scale, fit.f_load, bandwidth,
+            noise_floor, fit.rms, bool(reasons), "; ".join(reasons))
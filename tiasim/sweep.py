@@ -0,0 +1,170 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import concurrent.futures
+import inspect
+import numpy
+
+from .tiasim import Opamp, Photodiode, room_temperature
+from .ensemble import TIAEnsemble
+
+trapezoid = getattr(numpy, "trapezoid", None) or numpy.trapz
+
+sweep_dtype = numpy.dtype([
+    ("opamp", "U32"),
+    ("photodiode", "U32"),
+    ("R_F", "f8"),
+    ("C_F", "f8"),          # total C_F including parasitic
+    ("bandwidth", "f8"),    # -3 dB bandwidth, Hz
+    ("peaking", "f8"),      # max |ZM| relative to |ZM(f[0])|, dB
+    ("phase_margin", "f8"), # loop phase margin, degrees, nan without crossover
+    ("noise_rms", "f8"),    # dark output noise integrated over f, V rms
+    ("snr", "f8"),          # dc output at P over bright noise integrated over f, dB
+])
+
+def catalog(module, base):
+    """
+        one instance of every part in module (e.g. tiasim.opamps) derived from base,
+        skipping the generic model classes that need constructor arguments
+    """
+    parts = []
+    for name, cls in inspect.getmembers(module, inspect.isclass):
+        if not issubclass(cls, base) or cls.__module__ != module.__name__:
+            continue
+        parameters = list(inspect.signature(cls.__init__).parameters.values())[1:]
+        if all(p.default is not p.empty or p.kind == p.VAR_KEYWORD for p in parameters):
+            parts.append(cls())
+    return parts
+
+def sweep(opamps, photodiodes, R_F, C_F=None, f=None, P=1e-6, T=room_temperature,
+          workers=None, chunk_size=1024, callback=None, path=None):
+    """
+        evaluate every design in the grid opamps x photodiodes x R_F x C_F
+
+        opamps, photodiodes: sequences of part instances, see catalog()
+        R_F, C_F: 1-D sequences of feedback resistance and capacitance.
+                  C_F=None (or nan entries) selects the optimum C_F as in TIA.optimal_CF()
+        f: frequency grid for peaking and integrated noise, default logspace(1, 10, 500)
+        P: optical power for the SNR, in W
+        workers: number of worker processes, None for os.cpu_count(), 1 to run inline
+        chunk_size: number of designs evaluated together in one vectorized batch
+        callback: called as callback(done, total) after every finished chunk
+        path: optional .npy file the results are written to as they arrive (memory-mapped)
+
+        Returns a structured array with sweep_dtype, in grid order
+        (C_F varies fastest, then R_F, photodiode and opamp).
+        Unstable candidates can be dropped with results[results["phase_margin"] > 45.0].
+        Only one chunk of frequency responses is held in memory per worker.
+    """
+    opamps = list(opamps)
+    photodiodes = list(photodiodes)
+    R_F = numpy.atleast_1d(numpy.asarray(R_F, dtype=float))
+    C_F = numpy.atleast_1d(numpy.asarray(numpy.nan if C_F is None else C_F, dtype=float))
+    if f is None:
+        f = numpy.logspace(1, 10, 500)
+    context = (opamps, photodiodes, R_F, C_F, numpy.asarray(f, dtype=float), P, T)
+    total = len(opamps)*len(photodiodes)*len(R_F)*len(C_F)
+
+    if path is None:
+        results = numpy.empty(total, dtype=sweep_dtype)
+    else:
+        results = numpy.lib.format.open_memmap(path, mode="w+", dtype=sweep_dtype, shape=(total,))
+
+    run_chunks(_evaluate_chunk, context, results, chunk_size, workers, callback)
+    if path is not None:
+        results.flush()
+    return results
+
+def run_chunks(function, context, results, chunk_size, workers=None, callback=None, split=None):
+    """
+        fill results[start:stop] = function(context, start, stop) chunk by chunk
+
+        workers: number of worker processes, None for os.cpu_count(), 1 to run inline.
+        function and context must be picklable when a process pool is used.
+        callback(done, total) is called after every finished chunk.
+        split(context, start, stop): optional, the part of context that chunk needs, passed
+        to function instead of context, so that a pool task only pickles its own share of large inputs.
+    """
+    total = len(results)
+    chunks = [(start, min(start+chunk_size, total)) for start in range(0, total, chunk_size)]
+    if split is None:
+        split = lambda context, start, stop: context
+    done = 0
+    if workers == 1:
+        for start, stop in chunks:
+            results[start:stop] = function(split(context, start, stop), start, stop)
+            done += stop - start
+            if callback is not None:
+                callback(done, total)
+        return results
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(function, split(context, start, stop), start, stop): (start, stop) for start, stop in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            start, stop = futures[future]
+            results[start:stop] = future.result()
+            done += stop - start
+            if callback is not None:
+                callback(done, total)
+    return results
+
+def save_sweep(path, results):
+    """ write sweep results to a .npz file with one array per column """
+    numpy.savez(path, **{name: results[name] for name in results.dtype.names})
+
+def load_sweep(path):
+    """
+        read a .npz file written by save_sweep() back into a structured array
+        columns missing from older files are filled with nan
+    """
+    with numpy.load(path) as data:
+        results = numpy.empty(len(data[sweep_dtype.names[0]]), dtype=sweep_dtype)
+        for name in sweep_dtype.names:
+            results[name] = data[name] if name in data else numpy.nan
+    return results
+
+def _evaluate_chunk(context, start, stop):
+    """ metrics for the flat design indices start..stop of the sweep grid """
+    opamps, photodiodes, R_F, C_F, f, P, T = context
+    shape = (len(opamps), len(photodiodes), len(R_F), len(C_F))
+    i_op, i_pd, i_r, i_c = numpy.unravel_index(numpy.arange(start, stop), shape)
+    out = numpy.empty(stop-start, dtype=sweep_dtype)
+    part = i_op*len(photodiodes) + i_pd
+    for p in numpy.unique(part):
+        sel = numpy.flatnonzero(part == p)
+        opamp = opamps[i_op[sel[0]]]
+        diode = photodiodes[i_pd[sel[0]]]
+        tia = TIAEnsemble(opamp, diode, R_F[i_r[sel]], C_F[i_c[sel]])
+        noise = tia.noise_breakdown(f, P, T)
+        zm = numpy.abs(tia.ZM(f))
+        dark_rms = numpy.sqrt(trapezoid(noise.dark**2, f, axis=-1))
+        bright_rms = numpy.sqrt(trapezoid(noise.bright**2, f, axis=-1))
+        signal = diode.current(P)*zm[:, 0]
+
+        rows = out[sel]
+        rows["opamp"] = type(opamp).__name__
+        rows["photodiode"] = type(diode).__name__
+        rows["R_F"] = tia.R_F
+        rows["C_F"] = tia.C_F
+        rows["bandwidth"] = tia.bandwidth()
+        rows["peaking"] = 20.0*numpy.log10(zm.max(axis=-1)/zm[:, 0])
+        rows["phase_margin"] = tia.stability(f_min=f[0], f_max=f[-1]).phase_margin
+        rows["noise_rms"] = dark_rms
+        with numpy.errstate(divide="ignore"):
+            rows["snr"] = 20.0*numpy.log10(signal/bright_rms)
+        out[sel] = rows
+    return out
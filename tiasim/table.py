@@ -0,0 +1,204 @@
+"""
+    This file is part of TIASim.
+    https://github.com/aewallin/TIASim
+
+    TIASim is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    TIASim is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TIASim.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import io
+import json
+import os
+import numpy
+
+from .cache import array_key
+
+cache_dir_name = ".tiasim_cache"
+
+def parse_table(text):
+    """ numeric rows of a '#'-commented text table, comma, tab or space separated, as a 2-D array """
+    return numpy.loadtxt(io.StringIO(text.replace(",", " ")), comments="#", ndmin=2)
+
+def load_table(path, cache_dir=None):
+    """
+        numeric contents of a text table (digitized curve, spectrum analyzer CSV) as a 2-D array
+
+        The parsed table is kept as a .npy file in cache_dir, by default a
+        .tiasim_cache directory next to path, and later loads memory-map it.
+        The cache entry records the file's mtime, size and sha1, and is reused
+        while mtime and size match, or while the content hash matches after the
+        file was touched. Files are parsed directly when the cache is not writable.
+        The returned array is read-only, whether parsed or memory-mapped.
+    """
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), cache_dir_name)
+    name = "%s.%s" % (os.path.basename(path), hashlib.sha1(path.encode()).hexdigest()[:12])
+    data_path = os.path.join(cache_dir, name + ".npy")
+    meta_path = os.path.join(cache_dir, name + ".json")
+
+    stat = os.stat(path)
+    meta = {"path": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        with open(meta_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if cached.get("mtime_ns") == meta["mtime_ns"] and cached.get("size") == meta["size"] and os.path.exists(data_path):
+        return numpy.load(data_path, mmap_mode="r")
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    meta["sha1"] = hashlib.sha1(raw).hexdigest()
+    if cached.get("sha1") == meta["sha1"] and os.path.exists(data_path):
+        _write_meta(meta_path, meta)
+        return numpy.load(data_path, mmap_mode="r")
+
+    table = parse_table(raw.decode())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = data_path + ".%d.tmp" % os.getpid()
+        with open(tmp, "wb") as f:
+            numpy.save(f, table)
+        os.replace(tmp, data_path)
+        _write_meta(meta_path, meta)
+    except OSError:
+        pass
+    table.setflags(write=False)
+    return table
+
+def _write_meta(meta_path, meta):
+    tmp = meta_path + ".%d.tmp" % os.getpid()
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+def read_curve(path, x_scale=1.0, y_scale=1.0):
+    """
+        read a two-column digitized curve, e.g. examples/opa818/opa818_vn.txt,
+        with load_table(). Returns (x*x_scale, y*y_scale)
+    """
+    d = load_table(path)
+    return d[:, 0]*x_scale, d[:, 1]*y_scale
+
+class LogTable:
+    """
+        piecewise-linear interpolation of y (or log y, with log_y=True) against log x
+
+        With log_y=True a complex y is interpolated as log|y| plus its unwrapped
+        phase, i.e. magnitude in log-log and phase linear in log x.
+
+        Lookups use a uniform index over log x with bins narrower than the
+        narrowest table segment, so every bin holds at most one breakpoint and a
+        point's segment is found with one read of the index and one comparison
+        instead of a binary search. Tables too uneven for max_bins bins fall back
+        to numpy.searchsorted.
+
+        extrapolate: (low, high), whether to extend the end segments below x[0]
+                     and above x[-1]. Otherwise the end values are held.
+    """
+    def __init__(self, x, y, log_y=True, extrapolate=(False, False), max_bins=2**16):
+        x, keep = numpy.unique(numpy.asarray(x, dtype=float), return_index=True)
+        y = numpy.asarray(y)[keep]
+        if len(x) < 2:
+            raise ValueError("LogTable needs at least two distinct x values")
+        if x[0] <= 0 or (log_y and numpy.any(y == 0)) or (log_y and not numpy.iscomplexobj(y) and numpy.any(y < 0)):
+            raise ValueError("LogTable needs positive x, and positive y for log_y")
+        self.x = x
+        self.y = y
+        self.log_y = log_y
+        self.extrapolate = tuple(extrapolate)
+        u = numpy.log(x)
+        if not log_y:
+            v = y.astype(float)
+        elif numpy.iscomplexobj(y):
+            v = numpy.log(numpy.abs(y)) + 1j*numpy.unwrap(numpy.angle(y))
+        else:
+            v = numpy.log(y.astype(float))
+        self._u = u
+        self._slope = numpy.diff(v)/numpy.diff(u)
+        self._intercept = v[:-1] - self._slope*u[:-1]
+
+        # bins a little narrower than the narrowest segment, and each bin's segment
+        # taken just below the bin start, so rounding of the bin number never
+        # puts a point more than one segment beyond its bin's
+        width = numpy.diff(u).min()/(1.0 + 4e-6)
+        n_bins = int(numpy.ceil((u[-1] - u[0])/width)) + 1
+        if n_bins <= max_bins:
+            starts = u[0] + width*(numpy.arange(n_bins) - 1e-6)
+            self._index = numpy.clip(numpy.searchsorted(u, starts, side="right") - 1, 0, len(u)-2)
+            self._bound = numpy.append(u[1:-1], numpy.inf)[self._index]
+            self._scale = 1.0/width
+        else:
+            self._index = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def key(self):
+        """ hashable key of the table contents (see tiasim.cache.array_key()) and options, for cache keys """
+        return (array_key(self.x), array_key(self.y), self.log_y, self.extrapolate)
+
+    def __call__(self, x):
+        """ interpolated y at x """
+        return self.at_log(x, log_x=False)
+
+    def segment(self, u):
+        """ index i of the segment u[i] <= u < u[i+1] for log-x values u, clipped to the table """
+        if self._index is None:
+            return numpy.clip(numpy.searchsorted(self._u, u, side="right") - 1, 0, len(self._u)-2)
+        b = numpy.subtract(u, self._u[0])
+        b *= self._scale
+        b = numpy.clip(b, 0, len(self._index)-1, out=b if isinstance(b, numpy.ndarray) else None).astype(numpy.intp)
+        i = self._index[b]
+        i += u >= self._bound[b]
+        return i
+
+    def at_log(self, u, log_x=True, block=2**13):
+        """
+            interpolated y at log-x values u, or at x values u with log_x=False
+            Evaluated in blocks of u so the temporaries stay in cache.
+        """
+        u = numpy.asarray(u, dtype=float)
+        out = numpy.empty(u.shape, dtype=self._intercept.dtype)
+        flat_u = u.reshape(-1)
+        flat_out = out.reshape(-1)
+        for start in range(0, flat_u.size, block):
+            u_block = flat_u[start:start+block]
+            self._evaluate(u_block if log_x else numpy.log(u_block), flat_out[start:start+block])
+        return out[()]
+
+    def _evaluate(self, u, out):
+        low, high = self.extrapolate
+        if not (low and high):
+            u = numpy.clip(u, None if low else self._u[0], None if high else self._u[-1])
+        i = self.segment(u)
+        intercept, slope = self._intercept[i], self._slope[i]
+        if numpy.iscomplexobj(out):
+            phase = numpy.multiply(slope.imag, u)
+            phase += intercept.imag
+            v = numpy.multiply(slope.real, u)
+            v += intercept.real
+            if self.log_y:
+                numpy.exp(v, out=v)
+                numpy.multiply(v, numpy.cos(phase), out=out.real)
+                numpy.multiply(v, numpy.sin(phase), out=out.imag)
+            else:
+                out.real = v
+                out.imag = phase
+        else:
+            numpy.multiply(slope, u, out=out)
+            out += intercept
+            if self.log_y:
+                numpy.exp(out, out=out)
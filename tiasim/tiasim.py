@@ -19,7 +19,18 @@
 
 import numpy
 import abc
+import collections
+import warnings
 from scipy import constants
+from scipy import optimize
+import scipy.fft
+
+from .cache import ResponseCache, array_key, value_key
+from .frozen import Frozen
+from .integrate import integrate_log
+from .risetime import step_metrics
+from .stability import calc_loop_gain, stability
+from .rational import transfer_functions
 
 room_temperature=constants.convert_temperature(25, 'celsius', 'kelvin')
 
@@ -41,13 +52,88 @@ def calc_closed_loop_transimpedance(f, gain_f, z_f, c_tot):
     w = 2.0*numpy.pi*f
     return gain_f*z_f / ( 1.0 + gain_f + 1j*w*z_f*c_tot);
 
+BandwidthSolution = collections.namedtuple("BandwidthSolution", ["f_3dB", "found", "z_ref", "iterations"])
+BandwidthSolution.__doc__ = """
+    result of a -3 dB search
+    f_3dB: -3 dB frequency in Hz, numpy.nan when found is False
+    found: True when a crossing was bracketed inside the search range
+    z_ref: reference (low-frequency) magnitude the crossing is relative to
+    iterations: number of root-solver iterations used for the refinement
+"""
+
+def find_bandwidth(magnitude, f_min=1e1, f_max=1e10, rtol=1e-6, n_grid=500):
+    """
+    find the first frequency where magnitude(f) drops below magnitude(f_min)/sqrt(2)
+
+    magnitude: callable returning |H(f)| for an array or a scalar f
+    The crossing is bracketed on a coarse log-spaced grid of n_grid points
+    and then refined with Brent's method in log-frequency to relative tolerance rtol.
+    """
+    f = numpy.logspace(numpy.log10(f_min), numpy.log10(f_max), int(n_grid))
+    m = magnitude(f)
+    z_3db = m[0]/numpy.sqrt(2.0)
+    below = numpy.flatnonzero(m < z_3db)
+    if len(below) == 0:
+        return BandwidthSolution(numpy.nan, False, m[0], 0)
+    ind = below[0]
+
+    def residual(x):
+        return magnitude(10.0**x) - z_3db
+
+    x, r = optimize.brentq(residual, numpy.log10(f[ind-1]), numpy.log10(f[ind]),
+                           xtol=rtol/numpy.log(10.0), rtol=4*numpy.finfo(float).eps,
+                           full_output=True)
+    return BandwidthSolution(10.0**x, True, m[0], r.iterations)
+
+NoiseBreakdown = collections.namedtuple("NoiseBreakdown", ["amp_current", "amp_voltage", "johnson", "diode_dark",
+                                                         "shot", "dark", "bright"])
+NoiseBreakdown.__doc__ = """
+    output-referred TIA noise contributions in V/sqrt(Hz), see TIA.noise_breakdown()
+    diode_dark: shot noise of the diode dark current, 0 for a Photodiode
+    shot: shot noise of the photocurrent, including any APD excess noise
+    dark: amp_current, amp_voltage, johnson and diode_dark combined; bright adds shot
+"""
+
+IntegratedNoise = collections.namedtuple("IntegratedNoise", NoiseBreakdown._fields + ("f", "cumulative"))
+IntegratedNoise.__doc__ = """
+    output-referred RMS noise in V integrated over a frequency band, see TIA.integrated_noise()
+    f, cumulative: bright RMS noise integrated from the lower band edge up to f
+"""
+
 def estimate_bandwidth_from_rise_time(rise_time):
     '''10-90% rise time step response'''
     return 0.35/rise_time
 
 def estimate_rise_time_from_bandwidth(bandwidth):
     '''10-90% rise time step response'''
-    return estimate_bandwidth_from_rise_time(bandwidth)
+    return 0.35/bandwidth
+
+def calc_step_response(transfer, t, pad=4):
+    """
+    step response of a linear system at uniformly spaced times t starting at 0
+
+    transfer: callable returning H(f) for an array of frequencies, the result may have
+              leading batch axes, shape (..., len(f))
+    The impulse response is the inverse real FFT of H on a grid padded to pad*len(t)
+    samples to avoid wrap-around, integrated with the trapezoid rule.
+    scipy.fft keeps the FFT plans of recent lengths, so repeated calls on one grid reuse them.
+    """
+    t = numpy.asarray(t, dtype=float)
+    dt = t[1] - t[0]
+    n = scipy.fft.next_fast_len(pad*len(t), real=True)
+    H = transfer(scipy.fft.rfftfreq(n, dt))
+    h = scipy.fft.irfft(H, n, axis=-1)[..., :len(t)]
+    return numpy.cumsum(h, axis=-1) - 0.5*(h + h[..., :1])
+
+def step_time_grid(bandwidth, n_min=1024, n_max=2**16):
+    """
+    time grid for step responses of systems with the given -3 dB bandwidths
+    spanning 20 periods of the slowest and sampled at 40 points per period of the fastest
+    """
+    bw = numpy.asarray(bandwidth, dtype=float)
+    span = 20.0/numpy.nanmin(bw)
+    n = int(numpy.clip(numpy.ceil(span*40.0*numpy.nanmax(bw)), n_min, n_max))
+    return numpy.linspace(0.0, span, n)
 
 '''
 Opamp is an abstract base class. Each of the members with the
@@ -55,7 +141,13 @@ Opamp is an abstract base class. Each of the members with the
 otherwise instantiation of an object with that type will cause
 an exception.
 '''
-class Opamp(metaclass=abc.ABCMeta):
+class Opamp(Frozen):
+    """
+        immutable opamp model, see tiasim.frozen.Frozen.
+        Derived parts with extra parameters list them in __slots__, others set __slots__ = ().
+    """
+    __slots__ = ("_AOL_gain", "_AOL_bw", "_GBWP")
+
     def __init__(self, AOL_gain, AOL_bw, GBWP):
         self._AOL_gain = AOL_gain
         self._AOL_bw = AOL_bw
@@ -90,7 +182,10 @@ class Opamp(metaclass=abc.ABCMeta):
         pass
 
 
-class Photodiode:
+class Photodiode(Frozen):
+    """ immutable photodiode model, variants with e.g. diode.replace(capacitance=1.6e-12) """
+    __slots__ = ("capacitance", "responsivity")
+
     def __init__(self, capacitance, responsivity):
         self.capacitance = capacitance
         self.responsivity = responsivity # A/W
@@ -103,38 +198,114 @@ class Photodiode:
         """ photocurrent (A) produced by input optical power P """
         return self.responsivity*P
 
-class TIA():
+    def dark_current(self):
+        """ dark current (A), neglected for photodiodes """
+        return 0.0
+
+    def shot_noise_current(self, P):
+        """ shot noise current density (A/sqrt(Hz)) of the photocurrent at optical power P """
+        return numpy.sqrt(2.0*constants.elementary_charge*self.current(P))
+
+    def dark_noise_current(self):
+        """ shot noise current density (A/sqrt(Hz)) of the dark current """
+        return 0.0
+
+class TIA(Frozen):
+    """
+        immutable TIA design, see tiasim.frozen.Frozen. Use replace() for variants,
+        e.g. tia.replace(R_F=10e3), which keeps C_F as given to the constructor:
+        a component value stays, C_F=None is the optimum for the new parameters.
+        Each instance keeps its own response cache, which is not part of its value.
+    """
+    __slots__ = ("opamp", "diode", "R_F", "C_F", "C_F_parasitic", "C_tot", "_C_F_component", "_response_cache")
+    _unkeyed = Frozen._unkeyed + ("_response_cache",)
+
     def __init__(self, opamp, diode, R_F, C_F=None, C_F_parasitic=None):
-        """ build TIA from given opamp, diode and feedback resistance/capacitance """
+        """
+            build TIA from given opamp, diode and feedback resistance/capacitance.
+            diode is a Photodiode or an AvalanchePhotodiode, whose gain, excess noise
+            and dark current enter shot_noise(), dark_noise(), bright_noise() and dc_output().
+        """
         self.opamp = opamp
         self.diode = diode
         self.R_F = R_F # feedback resistance
         self.C_tot = self.diode.capacitance + self.opamp.input_capacitance() # total source capacitance
-        if C_F_parasitic:
-            self.C_F_parasitic=C_F_parasitic
-        else:
+        if C_F_parasitic is None:
             self.C_F_parasitic=0.01e-12 # minimum capacitance over R_F
+        else:
+            self.C_F_parasitic=C_F_parasitic
 
-        if C_F:
+        self._C_F_component = C_F # as given, None for the optimum
+        if C_F is not None:
             self.C_F = C_F + self.C_F_parasitic
         else:
-            self.set_CF()
+            self.C_F = self.optimal_CF()
+
+    def replace(self, **changes):
+        """
+            TIA with some of opamp, diode, R_F, C_F and C_F_parasitic changed.
+            C_F is the component value as in the constructor, C_F=None selects the optimum.
+        """
+        args = {"opamp": self.opamp, "diode": self.diode, "R_F": self.R_F,
+                "C_F": self._C_F_component, "C_F_parasitic": self.C_F_parasitic}
+        unknown = set(changes) - set(args)
+        if unknown:
+            raise TypeError("TIA has no parameter %s" % ", ".join(sorted(unknown)))
+        args.update(changes)
+        return TIA(**args)
+
+    @property
+    def response_cache(self):
+        try:
+            return self._response_cache
+        except AttributeError:
+            object.__setattr__(self, "_response_cache", ResponseCache())
+            return self._response_cache
+
+    def design_key(self):
+        """ hashable key of everything the frequency response depends on, see key() """
+        return self.key()
+
+    def response(self, f):
+        """
+            open-loop gain, ZF, ZM, closed loop voltage gain and opamp input noise at f
+            as a dict with keys "gain", "ZF", "ZM", "Avcl", "voltage_noise" and "current_noise".
+            Array results are cached per frequency grid in self.response_cache and are read-only.
+        """
+        f = numpy.asarray(f)
+        if f.ndim == 0:
+            return self._compute_response(f)
+        key = (self.design_key(), array_key(f))
+        entry = self.response_cache.get(key)
+        if entry is None:
+            entry = self.response_cache.put(key, self._compute_response(f))
+        return entry
+
+    def _compute_response(self, f):
+        A = self.opamp.gain(f)
+        w = 2.0*numpy.pi*f
+        zf = calc_feedback_transimpedance(f, self.R_F, self.C_F)
+        zm = calc_closed_loop_transimpedance(f, gain_f=A, z_f=zf, c_tot=self.C_tot)
+        Avcl = A / (1.0+A/(1.0+1j*w*zf*(self.C_tot)))  # closed loop voltage gain
+        return {"gain": A, "ZF": zf, "ZM": zm, "Avcl": Avcl,
+                "voltage_noise": numpy.asarray(self.opamp.voltage_noise(f)),
+                "current_noise": numpy.asarray(self.opamp.current_noise(f))}
 
+    def cache_info(self):
+        """ hits, misses and size of the response cache """
+        return self.response_cache.info()
 
     def ZF(self, f):
         """
             feedback impedance ZF = R_F || C_F
         """
-        return calc_feedback_transimpedance(f, self.R_F, self.C_F)
+        return self.response(f)["ZF"]
 
     def ZM(self,f):
         """
             closed loop transimpedance, Hobbs (18.15)
         """
-        A = self.opamp.gain(f)
-        w = 2.0*numpy.pi*f
-
-        return calc_closed_loop_transimpedance(f, gain_f=A, z_f=self.ZF(f), c_tot=self.C_tot)
+        return self.response(f)["ZM"]
 
     def amp_current_noise(self, f):
         """
@@ -147,9 +318,7 @@ class TIA():
         """
             output referred amplifier voltage noise, in V/sqrt(Hz)
         """
-        A = self.opamp.gain(f)
-        w = 2.0*numpy.pi*f
-        Avcl = A / (1.0+A/(1.0+1j*w*self.ZF(f)*(self.C_tot)))  # closed loop voltage gain
+        Avcl = self.response(f)["Avcl"] # closed loop voltage gain
         return self.opamp.voltage_noise(f) * numpy.abs(Avcl)
 
     def johnson_noise(self, f, T=room_temperature):
@@ -162,35 +331,110 @@ class TIA():
     def shot_noise(self, P, f):
         """
             output-referred shot noise in V/sqrt(Hz) due to optical power P in W
-            shot-noise current thru transimpedance.
+            shot-noise current thru transimpedance, with the excess noise of an APD.
 
             For the total TIA noise at power P use bright_noise()
         """
-        I_PD = self.diode.current(P)
-        return numpy.sqrt(2.0*constants.elementary_charge*I_PD) * numpy.abs(self.ZM(f))
+        return self.diode.shot_noise_current(P) * numpy.abs(self.ZM(f))
+
+    def diode_dark_noise(self, f):
+        """
+            output-referred shot noise of the diode dark current in V/sqrt(Hz),
+            zero for a Photodiode
+        """
+        return self.diode.dark_noise_current() * numpy.abs(self.ZM(f))
 
     def dark_noise(self, f):
         """
-            output referred TIA noise without any shot noise, in V/sqrt(Hz)
-            quadrature sum of voltage, current, and RF johnson noise
+            output referred TIA noise without photocurrent shot noise, in V/sqrt(Hz)
+            quadrature sum of voltage, current, RF johnson and diode dark-current noise
         """
         c2 = self.amp_current_noise(f)**2
         v2 = self.amp_voltage_noise(f)**2
         j2 = self.johnson_noise(f)**2
-        return numpy.sqrt( c2+v2+j2 )
+        d2 = self.diode_dark_noise(f)**2 if numpy.any(self.diode.dark_noise_current()) else 0.0
+        return numpy.sqrt( c2+v2+j2+d2 )
 
     def bright_noise(self,P,f):
         """
             output referred TIA bright-noise with optical power P
             dark_noise + shot noise of photocurrent.
-            Photocurrent computed as optical power times photodiode responsivity
+            Photocurrent computed as optical power times photodiode responsivity (and APD gain)
         """
         d2 = self.dark_noise(f)**2
         s2 = self.shot_noise(P,f)**2
         return numpy.sqrt( d2+s2 )
 
+    def noise_breakdown(self, f, P=0.0, T=room_temperature, out=None):
+        """
+            all output-referred noise contributions at f in one pass, as a NoiseBreakdown
+            of amp_current, amp_voltage, johnson, diode_dark, shot, dark and bright noise in V/sqrt(Hz).
+
+            The open-loop gain and transimpedance are evaluated once and shared.
+            out: optional NoiseBreakdown of float arrays with the shape of f, filled in place,
+            so that repeated calls on the same grid do not allocate.
+        """
+        return self._noise_breakdown(self.response(f), f, P, T, out)
+
+    def _noise_breakdown(self, r, f, P, T, out):
+        i_dark, i_shot = self.diode.dark_noise_current(), self.diode.shot_noise_current(P)
+        if out is None:
+            # array APD gain or temperature, or array T, broadcast against f
+            shape = numpy.broadcast_shapes(numpy.shape(f), numpy.shape(T), numpy.shape(i_dark), numpy.shape(i_shot))
+            out = NoiseBreakdown(*(numpy.empty(shape) for _ in NoiseBreakdown._fields))
+        zm = numpy.abs(r["ZM"], out=out.shot)
+        numpy.multiply(zm, r["current_noise"], out=out.amp_current)
+        numpy.multiply(zm, numpy.sqrt(4*constants.k*T/self.R_F), out=out.johnson)
+        numpy.multiply(zm, i_dark, out=out.diode_dark)
+        numpy.multiply(zm, i_shot, out=out.shot)
+        numpy.abs(r["Avcl"], out=out.amp_voltage)
+        numpy.multiply(out.amp_voltage, r["voltage_noise"], out=out.amp_voltage)
+        numpy.hypot(out.amp_current, out.amp_voltage, out=out.dark)
+        numpy.hypot(out.dark, out.johnson, out=out.dark)
+        numpy.hypot(out.dark, out.diode_dark, out=out.dark)
+        numpy.hypot(out.dark, out.shot, out=out.bright)
+        return out
+
+    def integrated_noise(self, f_lo, f_hi, P=0.0, T=room_temperature, rtol=1e-4):
+        """
+            output-referred RMS noise in V from f_lo to f_hi, as an IntegratedNoise of
+            the noise_breakdown() contributions plus the cumulative bright noise curve.
+
+            The noise power densities are integrated with adaptive Simpson's rule on a
+            log-frequency grid refined until each contribution has converged to rtol.
+            Results are cached per design. P and T are scalars.
+        """
+        if numpy.ndim(P) or numpy.ndim(T):
+            raise ValueError("integrated_noise() takes scalar P and T, call it once per value")
+        key = ("integrated_noise", self.design_key(), value_key(f_lo), value_key(f_hi), value_key(P), value_key(T), value_key(rtol))
+        entry = self.response_cache.get(key)
+        if entry is None:
+            def power(f):
+                n = self._noise_breakdown(self._compute_response(f), f, P, T, None)
+                return numpy.square(n)
+            result = integrate_log(power, f_lo, f_hi, rtol)
+            entry = self.response_cache.put(key, {"rms": numpy.sqrt(result.value), "f": result.f,
+                                                  "cumulative": numpy.sqrt(result.cumulative[-1])})
+        return IntegratedNoise(*entry["rms"], entry["f"], entry["cumulative"])
+
+    def enbw(self, rtol=1e-4):
+        """
+            equivalent noise bandwidth in Hz, integral of |ZM(f)|^2 over the low-frequency |ZM|^2,
+            integrated adaptively from 1e-6 to 1e4 times the -3 dB bandwidth, cached per design
+        """
+        key = ("enbw", self.design_key(), value_key(rtol))
+        entry = self.response_cache.get(key)
+        if entry is None:
+            bw = self.bandwidth()
+            f_lo = 1e-6*bw
+            z0 = numpy.abs(self._compute_response(f_lo)["ZM"])**2
+            result = integrate_log(lambda f: numpy.abs(self._compute_response(f)["ZM"])**2, f_lo, 1e4*bw, rtol)
+            entry = self.response_cache.put(key, {"enbw": numpy.asarray(f_lo + result.value[0]/z0)})
+        return float(entry["enbw"])
+
     def dc_output(self, P, f):
-        I_PD = self.diode.current(P)
+        """ output voltage amplitude at f of the photocurrent at optical power P plus the diode dark current """
+        I_PD = self.diode.current(P) + self.diode.dark_current()
         return I_PD*numpy.abs(self.ZM(f))
 
     def bandwidth_approx(self):
@@ -201,39 +445,84 @@ class TIA():
         return f3db
 
     def noise_bandwidth(self):
-        return self.bandwidth()
+        """ equivalent noise bandwidth, see enbw() """
+        return self.enbw()
+
+    def bandwidth_solution(self, rtol=1e-6, f_min=1e1, f_max=1e10):
+        """
+            -3 dB search result as a BandwidthSolution
+            found is False (and f_3dB nan) when ZM(f) stays above ZM(f_min)/sqrt(2) up to f_max
+        """
+        return find_bandwidth(lambda f: numpy.abs(self.ZM(f)), f_min, f_max, rtol)
 
-    def bandwidth(self):
+    def bandwidth(self, rtol=1e-6):
         """
             The -3 dB bandwidth of the TIA
-            Found by searching for the frequency where ZM(f) = ZM(0)/sqrt(2)
+            Found by solving for the frequency where ZM(f) = ZM(0)/sqrt(2)
+            to relative tolerance rtol. Returns numpy.nan if the -3 dB point is not found,
+            use bandwidth_solution() to get the structured result.
         """
-        f = numpy.logspace(1,10,int(1e6))
-        zm = numpy.abs( self.ZM(f) )
-        z_3db = zm[0]/numpy.sqrt(2.0)
-        try:
-            ind = min( min(numpy.where( zm < z_3db) ) )
-            #print zm[0], zm[ind], zm[ind]/zm[0]
-            f_3dB= f[ind]
-            return f_3dB
-        except:
-            print( "WARNING -3dB point not found" )
-            return -1
+        return self.bandwidth_solution(rtol).f_3dB
 
-    def set_CF(self):
+    def step_response(self, t):
+        """
+            output voltage in V per A of photocurrent step applied at t=0,
+            at uniformly spaced times t starting at 0. See calc_step_response()
+        """
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return calc_step_response(self.ZM, t)
+
+    def rise_time(self, t=None, settle=0.02):
         """
-            set optimum value for C_F
-            C_opt = sqrt( C_source / 2*pi*GBWP*R_F )
+            10-90% rise time, overshoot and settling time (to within settle of the final value)
+            of the modelled step response, as a StepMetrics
+        """
+        if t is None:
+            t = step_time_grid(self.bandwidth())
+        return step_metrics(t, self.step_response(t), settle=settle)
+
+    def transfer_functions(self):
+        """
+            closed loop transimpedance ZM and voltage gain Avcl as tiasim.rational.RationalTransfer,
+            for opamps with a pole model. Raises ValueError for other opamps.
+        """
+        return transfer_functions(self)
+
+    def loop_gain(self, f):
+        """ loop gain A beta, with feedback fraction beta = 1/(1 + j w ZF C_tot) """
+        r = self.response(f)
+        return calc_loop_gain(f, r["gain"], r["ZF"], self.C_tot)
+
+    def stability(self, rtol=1e-6, f_min=1e1, f_max=1e10):
+        """
+            unity-loop-gain crossover, phase margin, noise-gain peak and closed-loop Q
+            as a Stability, see tiasim.stability.stability()
+        """
+        result = stability(self._compute_response, self.C_tot, f_min, f_max, rtol)
+        return type(result)(*(x[()] for x in result))
+
+    def phase_margin(self, rtol=1e-6):
+        """ phase margin of the feedback loop in degrees, nan without a unity-gain crossover """
+        return self.stability(rtol).phase_margin
+
+    def optimal_CF(self):
+        """
+            optimum value for C_F
+            C_opt = sqrt( C_source / 2*pi*GBWP*R_F ), but not less than C_F_parasitic
 
             design point is Q=1/sqrt(2) ~ 0.71 which is the maximally flat "Butterworth" frequency response
         """
         C_optimal = numpy.sqrt( self.C_tot / (2.0*numpy.pi*self.opamp.GBWP*self.R_F))
-        if C_optimal > self.C_F_parasitic:
-            self.C_F = C_optimal
-        else:
-            self.C_F = self.C_F_parasitic
+        return max(C_optimal, self.C_F_parasitic)
 
-        print( "optimum: %.3f pF, set C_F= %.3f pF" % (C_optimal*1e12, self.C_F*1e12) )
+    def set_CF(self):
+        """
+            deprecated: TIA is immutable, so this no longer changes C_F in place.
+            Returns a copy with the optimum C_F, use tia = tia.replace(C_F=None) instead.
+        """
+        warnings.warn("TIA.set_CF() no longer changes the TIA, it returns a copy with the optimum C_F; "
+                      "use tia = tia.replace(C_F=None)", FutureWarning, stacklevel=2)
+        return self.replace(C_F=None)
 
     def cnr(self, f):
         """ carrier to noise ratio """
@@ -1,13 +1,20 @@
-import math
+import numpy
 from scipy import constants
+from scipy import special
 
 
 def fermi_dirac_dist(t, ev=1):
+    """
+    Fermi-Dirac occupation 1/(1 + exp((ev - kT)/kT)) at temperature t in K, energy ev in eV
+    t and ev broadcast against each other. Raises ValueError unless all t > 0.
+    """
+    t = numpy.asarray(t, dtype=float)
+    if numpy.any(t <= 0):
+        raise ValueError("temperature must be positive")
     eV_per_T = constants.k/constants.electron_volt
     e1 = eV_per_T * t
-    assert t > 0
-    b = 1/(1+math.exp((ev-e1)/t * 1/eV_per_T))
-    return b
+    b = special.expit(-(ev-e1)/t * 1/eV_per_T)   # 1/(1+exp(x)) without overflow at low t
+    return b[()]
 
 def calc_joules_per_photon(wavelength):
     return constants.h*constants.c/(wavelength)
@@ -21,7 +28,7 @@ Calculate the johnson noise in the given bandwidth for a resistor of value rm an
 '''
 def calc_johnson_current_noise(t, rm, b):
     kb = constants.k
-    return math.sqrt(4*kb*t*b/rm)
+    return numpy.sqrt(4*kb*t*b/rm)
 
 def calc_johnson_voltage_noise(t, rm, b):
     return calc_johnson_current_noise(t, rm, b)*rm